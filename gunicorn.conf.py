@@ -0,0 +1,15 @@
+"""Gunicorn hooks, the file is loaded from the working directory."""
+
+
+def pre_fork(server, worker):
+    """Close pools of preloaded app so workers do not inherit them."""
+    if server.cfg.preload_app:
+        from server.src.db_pool import close_connection_pools
+        close_connection_pools()
+
+
+def post_fork(server, worker):
+    """Forget pools copied from master, worker opens its own pool."""
+    if server.cfg.preload_app:
+        from server.src.db_pool import forget_connection_pools
+        forget_connection_pools()
@@ -1,6 +1,29 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_init, post_save
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'server.api'
+
+    def ready(self):
+        """Connect query recorder and token status cache handlers.
+
+        Password validators are built here, so the common password list
+        is read once per worker and not by the first signup request.
+        """
+        from django.contrib.auth import password_validation
+
+        from server.api.authentication import (
+            user_deleted,
+            user_loaded,
+            user_saved,
+        )
+        from server.api.instrumentation import install_query_recorder
+        from server.payment.models import User
+        connection_created.connect(install_query_recorder)
+        post_init.connect(user_loaded, sender=User)
+        post_save.connect(user_saved, sender=User)
+        post_delete.connect(user_deleted, sender=User)
+        password_validation.get_default_password_validators()
@@ -0,0 +1,58 @@
+import asyncio
+import weakref
+
+from django.conf import settings
+from django.core.cache import cache
+from redis import asyncio as redis_asyncio
+
+from server.api.cache_utils import (
+    GENERATION_KEY,
+    local_tier_enabled,
+    record_cache_access,
+)
+from server.api.local_cache import local_cache
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_redis_client():
+    """Async Redis client of current event loop or None without Redis."""
+    if not settings.CACHES['default']['BACKEND'].startswith('django_redis'):
+        return None
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = redis_asyncio.from_url(settings.CACHES['default']['LOCATION'])
+        _clients[loop] = client
+    return client
+
+
+async def aget(key: str):
+    """Read value written by Django cache without blocking event loop."""
+    redis_client = get_async_redis_client()
+    if redis_client is None:
+        return await cache.aget(key)
+    value = await redis_client.get(str(cache.client.make_key(key)))
+    if value is None:
+        return None
+    return cache.client.decode(value)
+
+
+async def atiered_get(key: str):
+    """Async variant of tiered_get: in-process tier, then Redis."""
+    local = local_tier_enabled()
+    if local:
+        value = local_cache.get(key)
+        record_cache_access('local', value is not None, value)
+        if value is not None:
+            return value
+    value = await aget(key)
+    record_cache_access('redis', value is not None, value)
+    if local and value is not None:
+        local_cache.set(key, value)
+    return value
+
+
+async def aget_generation(basename: str) -> int | None:
+    """Current cache generation or None before it is initialized."""
+    return await atiered_get(GENERATION_KEY.format(basename=basename))
@@ -0,0 +1,110 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.urls import URLPattern
+from django.utils.cache import patch_vary_headers
+from rest_framework import exceptions
+
+from server.api.async_cache import aget_generation, atiered_get
+from server.api.cache_utils import CachedViewSetMixin, build_cache_key
+
+ASYNC_READ_ROUTES = (
+    'collect-list',
+    'collect-detail',
+    'payment-list',
+    'payment-detail',
+)
+CACHE_ACTIONS = {'list': 'list', 'retrieve': 'detail'}
+
+
+def async_read_view(sync_view):
+    """Wrap DRF viewset view into async view with async cache reads.
+
+    Fresh cache hits are served on the event loop. Misses, expired
+    entries and other methods go to the sync view in a thread, so it
+    keeps computing, locking and storing entries as before.
+    """
+    viewset = sync_view.cls
+    action = sync_view.actions.get('get')
+    run_sync = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if (
+            request.method == 'GET'
+            and action in CACHE_ACTIONS
+            and 'format' not in kwargs
+            and issubclass(viewset, CachedViewSetMixin)
+        ):
+            response = await cached_read(
+                viewset(**sync_view.initkwargs), action, request, args, kwargs
+            )
+            if response is not None:
+                return response
+        return await run_sync(request, *args, **kwargs)
+
+    view.csrf_exempt = True
+    view.cls = viewset
+    view.initkwargs = sync_view.initkwargs
+    view.actions = sync_view.actions
+    return view
+
+
+async def cached_read(view, action: str, request, args, kwargs):
+    """Response from fresh cache entry or None to use sync view."""
+    view.action_map = {'get': action}
+    view.args = args
+    view.kwargs = kwargs
+    view.format_kwarg = None
+    view.headers = {}
+    drf_request = view.initialize_request(request, *args, **kwargs)
+    view.request = drf_request
+    try:
+        renderer, media_type = view.perform_content_negotiation(drf_request)
+        view.check_permissions(drf_request)
+    except exceptions.APIException:
+        return None
+    if renderer.format != 'json':
+        return None
+    drf_request.accepted_renderer = renderer
+    drf_request.accepted_media_type = media_type
+    generation = await aget_generation(view.basename)
+    if generation is None:
+        return None
+    cache_action = CACHE_ACTIONS[action]
+    if view._is_rendered_mode():
+        cache_action = f'{cache_action}:rendered'
+    key = build_cache_key(
+        view.basename, generation, cache_action, request.GET, **kwargs
+    )
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if view._is_rendered_mode() and if_none_match:
+        etag = await atiered_get(f'{key}:etag')
+        if etag in (value.strip() for value in if_none_match.split(',')):
+            return view._not_modified(etag)
+    entry = await atiered_get(key)
+    if entry is None or view._should_refresh(entry):
+        return None
+    if 'data' not in entry:
+        return view._serve(entry)
+    response = HttpResponse(
+        renderer.render(
+            entry['data'], media_type, view.get_renderer_context()
+        ),
+        content_type=media_type,
+    )
+    if len(view.renderer_classes) > 1:
+        patch_vary_headers(response, ('Accept',))
+    return response
+
+
+def async_read_urls(patterns: list) -> list:
+    """Replace list and detail routes of cached viewsets by async views."""
+    return [
+        URLPattern(
+            pattern.pattern,
+            async_read_view(pattern.callback),
+            pattern.default_args,
+            pattern.name,
+        )
+        if pattern.name in ASYNC_READ_ROUTES else pattern
+        for pattern in patterns
+    ]
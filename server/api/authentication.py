@@ -0,0 +1,196 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import (
+    JWTAuthentication,
+    JWTStatelessUserAuthentication,
+)
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+
+from server.payment.models import User
+
+USER_CLAIMS = ('username', 'email', 'is_superuser', 'is_staff')
+TOKEN_FIELDS = ('password', 'is_active', *USER_CLAIMS)
+USER_ACTIVE_KEY = 'auth:user:{user_id}:active'
+USER_REVOKED_KEY = 'auth:user:{user_id}:revoked-before'
+TOKEN_REVOKED_MESSAGE = _('Token was revoked or user is inactive.')
+
+
+def user_token_is_valid(user_id: int, issued_at: int) -> bool:
+    """Check revocation and active status of token owner in cache.
+
+    Both keys are read with one round trip. The database is queried
+    only when active status is not cached yet.
+    """
+    active_key = USER_ACTIVE_KEY.format(user_id=user_id)
+    revoked_key = USER_REVOKED_KEY.format(user_id=user_id)
+    values = cache.get_many((active_key, revoked_key))
+    revoked_before = values.get(revoked_key)
+    if revoked_before is not None and issued_at < revoked_before:
+        return False
+    is_active = values.get(active_key)
+    if is_active is None:
+        is_active = User.objects.filter(pk=user_id, is_active=True).exists()
+        cache.set(active_key, is_active, settings.JWT_USER_STATUS_TIMEOUT)
+    return is_active
+
+
+def revoke_user_tokens(user_id: int) -> None:
+    """Reject tokens of user issued before now."""
+    cache.set(
+        USER_REVOKED_KEY.format(user_id=user_id),
+        int(time.time()),
+        int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()),
+    )
+
+
+def password_rehashed(instance, update_fields) -> bool:
+    """Whether save only stores new hash of the same password.
+
+    check_password() rehashes passwords of outdated hasher or cost on
+    login and clears _password before saving, unlike set_password().
+    """
+    return update_fields == {'password'} and instance._password is None
+
+
+def loaded_token_fields(instance) -> dict:
+    """Loaded values of fields which tokens depend on.
+
+    Deferred fields are skipped instead of being loaded.
+    """
+    return {
+        field: instance.__dict__[field]
+        for field in TOKEN_FIELDS
+        if field in instance.__dict__
+    }
+
+
+def user_loaded(sender, instance, **kwargs) -> None:
+    """Remember token fields to detect their changes on save."""
+    instance._loaded_token_fields = loaded_token_fields(instance)
+
+
+def token_fields_changed(instance, update_fields) -> bool:
+    """Whether save changed password, status or claims of user."""
+    loaded = instance._loaded_token_fields
+    return any(
+        field not in loaded or loaded[field] != value
+        for field, value in loaded_token_fields(instance).items()
+        if update_fields is None or field in update_fields
+    )
+
+
+def user_saved(
+    sender, instance, created: bool, update_fields=None, **kwargs
+) -> None:
+    """Refresh cached status, revoke tokens with outdated claims.
+
+    Saves of other fields, e.g. last_login, and rehash on login keep
+    tokens valid.
+    """
+    cache.set(
+        USER_ACTIVE_KEY.format(user_id=instance.pk),
+        instance.is_active,
+        settings.JWT_USER_STATUS_TIMEOUT,
+    )
+    if (
+        not created
+        and not password_rehashed(instance, update_fields)
+        and token_fields_changed(instance, update_fields)
+    ):
+        revoke_user_tokens(instance.pk)
+    instance._loaded_token_fields = loaded_token_fields(instance)
+
+
+def user_deleted(sender, instance, **kwargs) -> None:
+    """Tokens of deleted user are not valid anymore."""
+    cache.set(
+        USER_ACTIVE_KEY.format(user_id=instance.pk),
+        False,
+        settings.JWT_USER_STATUS_TIMEOUT,
+    )
+
+
+def token_author(user) -> User:
+    """User instance to save as author without loading it."""
+    if isinstance(user, ClaimsTokenUser):
+        return user.as_model()
+    return user
+
+
+class ClaimsTokenUser(TokenUser):
+    """Token user with profile fields from token claims."""
+
+    @cached_property
+    def id(self) -> int:
+        """Claim is a string, primary key type is used for comparisons."""
+        return User._meta.pk.to_python(
+            self.token[api_settings.USER_ID_CLAIM]
+        )
+
+    @cached_property
+    def pk(self) -> int:
+        return self.id
+
+    @cached_property
+    def email(self) -> str:
+        return self.token.get('email', '')
+
+    def as_model(self) -> User:
+        """Unsaved User instance with primary key and claims."""
+        return User(
+            pk=self.id,
+            **{claim: getattr(self, claim) for claim in USER_CLAIMS},
+        )
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Token pair with user fields needed by API in claims."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh serializer which rejects revoked refresh tokens."""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        if user_id and not user_token_is_valid(user_id, refresh['iat']):
+            raise AuthenticationFailed(
+                TOKEN_REVOKED_MESSAGE, code='token_revoked'
+            )
+        return super().validate(attrs)
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """JWT authentication with user built from token claims.
+
+    Only revocation and active status are checked in cache, so the
+    user row is not loaded on every request. Tokens issued before
+    claims were added fall back to database lookup.
+    """
+
+    def get_user(self, validated_token):
+        if not all(claim in validated_token for claim in USER_CLAIMS):
+            return JWTAuthentication.get_user(self, validated_token)
+        user = super().get_user(validated_token)
+        if not user_token_is_valid(user.id, validated_token['iat']):
+            raise AuthenticationFailed(
+                TOKEN_REVOKED_MESSAGE, code='token_revoked'
+            )
+        return user
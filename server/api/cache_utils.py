@@ -1,33 +1,139 @@
+import gzip
+import hashlib
+import logging
+import math
+import random
+import threading
+import time
+from functools import partial
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
 from rest_framework.response import Response
 
+from server.api.instrumentation import record_cache_metrics
+from server.api.local_cache import invalidation_listener, local_cache
+from server.api.redis_utils import get_redis_client
+from server.api.tasks import refresh_cache_task
 
-class CachedViewSetMixin:
-    """Mixin for caching GET methods and updating data for them."""
+logger = logging.getLogger(__name__)
 
-    cache_timeout = 300
+GENERATION_KEY = '{basename}:generation'
+LOCK_POLL_INTERVAL = 0.05
+RENDERED_COMPRESSION_MIN_SIZE = 1024
+CACHE_DEPENDENCIES = {
+    'user': ('collect', 'payment'),
+    'collect': ('payment',),
+    'payment': ('collect',),
+}
+CACHE_TIERS = ('local', 'redis')
 
-    def list(self, request, *args, **kwargs):
-        """Caching list of instances."""
-        key = f'{self.basename}:list'
-        data = cache.get(key)
-        if data:
-            return Response(data)
-        response = super().list(request, *args, **kwargs)
-        cache.set(key, response.data, self.cache_timeout)
-        print('success_caching')
-        return response
+_stats = {tier: {'hits': 0, 'misses': 0} for tier in CACHE_TIERS}
+_stats_lock = threading.Lock()
 
-    def retrieve(self, request, *args, **kwargs):
-        """Cache one instance which was got by PK."""
-        key = f'{self.basename}:detail:{kwargs['pk']}'
-        data = cache.get(key)
-        if data:
-            return Response(data)
-        response = super().retrieve(request, *args, **kwargs)
-        cache.set(key, response.data, self.cache_timeout)
-        print('success_caching')
-        return response
+
+def record_cache_access(tier: str, hit: bool, value=None) -> None:
+    """Count hit or miss of cache tier in worker and request metrics."""
+    with _stats_lock:
+        _stats[tier]['hits' if hit else 'misses'] += 1
+    record_cache_metrics(tier, hit, value)
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    """Hit and miss counters of every cache tier in this process."""
+    with _stats_lock:
+        return {tier: dict(counters) for tier, counters in _stats.items()}
+
+
+def local_tier_enabled() -> bool:
+    """Check local tier setting and start invalidation listener."""
+    if not settings.CACHE_LOCAL_TIER['ENABLED']:
+        return False
+    redis_client = get_redis_client()
+    if redis_client is not None:
+        invalidation_listener.ensure_started(redis_client)
+    return True
+
+
+def tiered_get(key: str):
+    """Get value from in-process tier, then from Redis."""
+    local = local_tier_enabled()
+    if local:
+        value = local_cache.get(key)
+        record_cache_access('local', value is not None, value)
+        if value is not None:
+            return value
+    value = cache.get(key)
+    record_cache_access('redis', value is not None, value)
+    if local and value is not None:
+        local_cache.set(key, value)
+    return value
+
+
+def tiered_set(key: str, value, timeout: int | None) -> None:
+    """Set value in Redis and in-process tier."""
+    cache.set(key, value, timeout)
+    if local_tier_enabled():
+        local_cache.set(key, value)
+
+
+def get_generation(basename: str) -> int:
+    """Current cache generation of resource."""
+    key = GENERATION_KEY.format(basename=basename)
+    generation = tiered_get(key)
+    if generation is None:
+        cache.add(key, time.time_ns() // 1000, None)
+        generation = tiered_get(key)
+    return generation
+
+
+def bump_generation(basename: str) -> None:
+    """Move resource to the next generation in O(1)."""
+    key = GENERATION_KEY.format(basename=basename)
+    try:
+        cache.incr(key)
+    except ValueError:
+        get_generation(basename)
+        cache.incr(key)
+    local_cache.delete_prefix(f'{basename}:')
+    redis_client = get_redis_client()
+    if settings.CACHE_LOCAL_TIER['ENABLED'] and redis_client is not None:
+        redis_client.publish(settings.CACHE_INVALIDATION_CHANNEL, basename)
+
+
+def invalidate(basename: str) -> None:
+    """Invalidate resource and every resource which embeds it."""
+    for name in (basename, *CACHE_DEPENDENCIES.get(basename, ())):
+        bump_generation(name)
+
+
+def build_cache_key(
+    basename: str, generation: int, action: str, query_params, **kwargs
+) -> str:
+    """Cache key with resource generation, kwargs and query string."""
+    params = urlencode(sorted(query_params.lists()), doseq=True)
+    digest = hashlib.md5(
+        f'{sorted(kwargs.items())}?{params}'.encode()
+    ).hexdigest()
+    return f'{basename}:{generation}:{action}:{digest}'
+
+
+def make_cache_key(basename: str, action: str, request, **kwargs) -> str:
+    """Cache key of request in current generation of resource."""
+    return build_cache_key(
+        basename,
+        get_generation(basename),
+        action,
+        request.query_params,
+        **kwargs,
+    )
+
+
+class CacheInvalidationMixin:
+    """Mixin for invalidating cached GET methods after writes."""
 
     def perform_create(self, serializer):
         """Clear cache after creating new instance."""
@@ -44,7 +150,197 @@ class CachedViewSetMixin:
         self._clear_cache_for(self.basename, pk)
 
     def _clear_cache_for(self, basename: str, pk: int | None = None):
-        """Delete cache after updating data."""
-        cache.delete(f'{basename}:list')
-        if pk:
-            cache.delete(f'{basename}:retrieve:{pk}')
+        """Delete cache after updating data.
+
+        Every cached page and instance of resource is dropped at once
+        by moving its generation, so pk is not needed to find keys.
+        """
+        invalidate(basename)
+
+
+class CachedViewSetMixin(CacheInvalidationMixin):
+    """Mixin for caching GET methods and updating data for them.
+
+    Only one worker recomputes an expired entry while others get the
+    previous value or wait for the fresh one. Entries may be refreshed
+    before expiry with probability growing to expiry (XFetch), and in
+    stale-while-revalidate mode refresh happens in a Celery task.
+    In rendered mode JSON responses are cached as final body bytes
+    with ETag, so hits skip serialization and rendering.
+    """
+
+    cache_timeout = 300
+    cache_stale_timeout = 60
+    cache_lock_timeout = 30
+    cache_lock_wait = 2.0
+    cache_early_refresh_beta = 1.0
+    cache_stampede_protection = True
+    cache_stale_while_revalidate = settings.CACHE_STALE_WHILE_REVALIDATE
+    cache_rendered = settings.CACHE_RENDERED_RESPONSES
+    cache_rendered_compression = settings.CACHE_RENDERED_COMPRESSION
+
+    def list(self, request, *args, **kwargs):
+        """Caching list of instances."""
+        return self._cached_response(
+            'list', request, partial(super().list, request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """Cache one instance which was got by PK."""
+        return self._cached_response(
+            'detail',
+            request,
+            partial(super().retrieve, request, *args, **kwargs),
+            **kwargs,
+        )
+
+    def _cached_response(self, action: str, request, compute, **kwargs):
+        """Return cached data or recompute it under the lock."""
+        if self._is_rendered_mode():
+            action = f'{action}:rendered'
+        key = make_cache_key(self.basename, action, request, **kwargs)
+        if getattr(request, 'cache_refresh', False):
+            return self._refresh(key, compute)
+        if self._is_rendered_mode():
+            etag = self._matching_etag(key)
+            if etag is not None:
+                return self._not_modified(etag)
+        entry = tiered_get(key)
+        if entry is not None and not self._should_refresh(entry):
+            return self._serve(entry)
+        if not self.cache_stampede_protection:
+            return self._store(key, compute)
+        if not cache.add(f'{key}:lock', 1, self.cache_lock_timeout):
+            return self._wait_for(key, entry, compute)
+        if entry is not None and self.cache_stale_while_revalidate:
+            refresh_cache_task.delay(
+                view_path=(
+                    f'{type(self).__module__}.{type(self).__qualname__}'
+                ),
+                basename=self.basename,
+                action=self.action,
+                path=request.path,
+                query_string=request.META.get('QUERY_STRING', ''),
+                host=request.get_host(),
+                secure=request.is_secure(),
+                accept=request.META.get('HTTP_ACCEPT', ''),
+                kwargs=kwargs,
+            )
+            return self._serve(entry)
+        return self._refresh(key, compute)
+
+    def _should_refresh(self, entry: dict) -> bool:
+        """Check expiry with probabilistic early refresh (XFetch)."""
+        now = time.time()
+        if now >= entry['expires_at']:
+            return True
+        if not self.cache_early_refresh_beta:
+            return False
+        early = entry['delta'] * self.cache_early_refresh_beta * -math.log(
+            1.0 - random.random()
+        )
+        return now + early >= entry['expires_at']
+
+    def _refresh(self, key: str, compute):
+        """Recompute entry under the taken lock and release it."""
+        try:
+            return self._store(key, compute)
+        finally:
+            cache.delete(f'{key}:lock')
+
+    def _store(self, key: str, compute):
+        """Compute response and store it with expiry metadata."""
+        started = time.time()
+        response = compute()
+        if response.status_code != 200:
+            return response
+        entry = {
+            'expires_at': time.time() + self.cache_timeout,
+            'delta': time.time() - started,
+        }
+        timeout = self.cache_timeout + self.cache_stale_timeout
+        if not self._is_rendered_mode():
+            tiered_set(key, {**entry, 'data': response.data}, timeout)
+            logger.debug('Cached %s', key)
+            return response
+        entry.update(self._render(response.data))
+        tiered_set(key, entry, timeout)
+        tiered_set(f'{key}:etag', entry['etag'], timeout)
+        logger.debug('Cached %s', key)
+        return self._serve(entry)
+
+    def _wait_for(self, key: str, entry: dict | None, compute):
+        """Serve previous value or wait until lock owner stores entry."""
+        if entry is not None:
+            return self._serve(entry)
+        deadline = time.monotonic() + self.cache_lock_wait
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            entry = tiered_get(key)
+            if entry is not None:
+                return self._serve(entry)
+        return compute()
+
+    def _is_rendered_mode(self) -> bool:
+        """Whether response is cached as rendered JSON bytes."""
+        return (
+            self.cache_rendered
+            and getattr(self.request, 'accepted_renderer', None) is not None
+            and self.request.accepted_renderer.format == 'json'
+        )
+
+    def _matching_etag(self, key: str) -> str | None:
+        """Cached ETag if it matches If-None-Match header, payload unread."""
+        if_none_match = self.request.META.get('HTTP_IF_NONE_MATCH')
+        if not if_none_match:
+            return None
+        etag = tiered_get(f'{key}:etag')
+        if etag in (value.strip() for value in if_none_match.split(',')):
+            return etag
+        return None
+
+    def _render(self, data) -> dict:
+        """Render data to JSON bytes, compress them and build ETag."""
+        body = self.request.accepted_renderer.render(
+            data,
+            self.request.accepted_media_type,
+            self.get_renderer_context(),
+        )
+        rendered = {
+            'etag': f'"{hashlib.md5(body).hexdigest()}"',
+            'content_type': self.request.accepted_media_type,
+            'encoding': None,
+            'body': body,
+        }
+        if (
+            self.cache_rendered_compression == 'gzip'
+            and len(body) >= RENDERED_COMPRESSION_MIN_SIZE
+        ):
+            rendered['encoding'] = 'gzip'
+            rendered['body'] = gzip.compress(body, compresslevel=5)
+        return rendered
+
+    def _serve(self, entry: dict):
+        """Build response from cached data or rendered bytes."""
+        if 'data' in entry:
+            return Response(entry['data'])
+        body = entry['body']
+        accepts_gzip = 'gzip' in self.request.META.get(
+            'HTTP_ACCEPT_ENCODING', ''
+        )
+        if entry['encoding'] == 'gzip' and not accepts_gzip:
+            body = gzip.decompress(body)
+        response = HttpResponse(body, content_type=entry['content_type'])
+        if entry['encoding'] == 'gzip' and accepts_gzip:
+            response['Content-Encoding'] = 'gzip'
+        if entry['encoding'] == 'gzip':
+            patch_vary_headers(response, ('Accept-Encoding',))
+        response['ETag'] = entry['etag']
+        return response
+
+    @staticmethod
+    def _not_modified(etag: str):
+        """Response for request with matching If-None-Match."""
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
@@ -0,0 +1,170 @@
+import csv
+import gzip
+import io
+import json
+import tempfile
+from collections.abc import Iterable, Iterator
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage, storages
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils import timezone
+
+from server.payment.models import Payment
+
+EXPORT_COLUMNS = ('id', 'created_at', 'amount', 'comment', 'user__username')
+EXPORT_HEADER = ('id', 'created_at', 'amount', 'comment', 'author')
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+EXPORT_PATH = 'collect-{pk}/payments-{token}.{type}.gz'
+EXPORT_STORAGE = 'exports'
+# Exports were written to public media storage under this directory.
+LEGACY_EXPORT_DIR = 'exports'
+STREAM_LINES_PER_CHUNK = 500
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class LineBuffer:
+    """File-like object which returns written line instead of storing it."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def payment_rows(collect_id: int) -> Iterator[tuple]:
+    """Payments of collect read in chunks from server-side cursor."""
+    return Payment.objects.filter(collect_id=collect_id).order_by(
+        'created_at', 'id'
+    ).values_list(*EXPORT_COLUMNS).iterator(
+        chunk_size=settings.PAYMENT_EXPORT_CHUNK_SIZE
+    )
+
+
+def csv_cell(value):
+    """Text starting like a formula is quoted for spreadsheets."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_lines(rows: Iterable[tuple]) -> Iterator[str]:
+    """CSV header and one line per row, safe to open in spreadsheets."""
+    writer = csv.writer(LineBuffer())
+    yield writer.writerow(EXPORT_HEADER)
+    for row in rows:
+        yield writer.writerow([csv_cell(value) for value in row])
+
+
+def ndjson_lines(rows: Iterable[tuple]) -> Iterator[str]:
+    """One JSON object per row and line."""
+    for row in rows:
+        yield json.dumps(
+            dict(zip(EXPORT_HEADER, row)),
+            cls=DjangoJSONEncoder,
+            ensure_ascii=False,
+        ) + '\n'
+
+
+EXPORT_WRITERS = {'csv': csv_lines, 'ndjson': ndjson_lines}
+
+
+def export_lines(collect_id: int, export_type: str) -> Iterator[str]:
+    """Lines of payments export, memory does not grow with row count."""
+    return EXPORT_WRITERS[export_type](payment_rows(collect_id))
+
+
+def export_stream(collect_id: int, export_type: str) -> Iterator[str]:
+    """Export lines joined into chunks to avoid tiny socket writes."""
+    lines = []
+    for line in export_lines(collect_id, export_type):
+        lines.append(line)
+        if len(lines) == STREAM_LINES_PER_CHUNK:
+            yield ''.join(lines)
+            lines.clear()
+    if lines:
+        yield ''.join(lines)
+
+
+def export_storage():
+    """Private storage of exports, it is not served under MEDIA_URL."""
+    return storages[EXPORT_STORAGE]
+
+
+def export_name(collect_id: int, export_type: str, token: str) -> str:
+    """Storage name of export, random token keeps it unguessable."""
+    return EXPORT_PATH.format(pk=collect_id, token=token, type=export_type)
+
+
+def export_to_storage(collect_id: int, export_type: str, name: str) -> str:
+    """Write gzipped export to private storage, return its name.
+
+    Export is compressed into a temporary file which spills to disk,
+    so the file appears in storage only when it is complete.
+    """
+    with tempfile.SpooledTemporaryFile(
+        max_size=settings.PAYMENT_EXPORT_SPOOL_SIZE
+    ) as buffer:
+        with gzip.GzipFile(fileobj=buffer, mode='wb') as archive:
+            text = io.TextIOWrapper(archive, encoding='utf-8', newline='')
+            text.writelines(export_lines(collect_id, export_type))
+            text.flush()
+            text.detach()
+        buffer.seek(0)
+        return export_storage().save(name, File(buffer))
+
+
+def export_deadline():
+    """Exports modified before this moment are expired."""
+    return timezone.now() - timedelta(seconds=settings.PAYMENT_EXPORT_TTL)
+
+
+def export_response(name: str, filename: str) -> HttpResponse:
+    """Download of written export which is not expired yet.
+
+    With PAYMENT_EXPORT_ACCEL_REDIRECT nginx sends the file from its
+    internal location, otherwise the file is streamed by Django.
+    """
+    storage = export_storage()
+    if (
+        not storage.exists(name)
+        or storage.get_modified_time(name) < export_deadline()
+    ):
+        raise Http404('Export is not ready or has expired.')
+    disposition = f'attachment; filename="{filename}"'
+    accel_prefix = settings.PAYMENT_EXPORT_ACCEL_REDIRECT
+    if not accel_prefix:
+        response = FileResponse(
+            storage.open(name), content_type='application/gzip'
+        )
+    else:
+        response = HttpResponse(content_type='application/gzip')
+        response['X-Accel-Redirect'] = accel_prefix + name
+    response['Content-Disposition'] = disposition
+    return response
+
+
+def delete_expired_exports() -> int:
+    """Delete expired exports and public ones, return count of files."""
+    deleted = 0
+    for storage, directory, deadline in (
+        (export_storage(), '', export_deadline()),
+        (default_storage, LEGACY_EXPORT_DIR, None),
+    ):
+        if not storage.exists(directory):
+            continue
+        for collect_directory in storage.listdir(directory)[0]:
+            path = f'{directory}/{collect_directory}'.lstrip('/')
+            for filename in storage.listdir(path)[1]:
+                name = f'{path}/{filename}'
+                if (
+                    deadline is None
+                    or storage.get_modified_time(name) < deadline
+                ):
+                    storage.delete(name)
+                    deleted += 1
+    return deleted
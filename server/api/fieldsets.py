@@ -0,0 +1,313 @@
+from collections.abc import Callable
+from typing import Any, NamedTuple
+
+from django.utils.functional import cached_property
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from server.api.instrumentation import timed
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+FIELD_SELECTION_CONTEXT = 'field_selection'
+
+
+def parse_field_paths(value: str) -> dict:
+    """Tree of comma separated dotted paths, e.g. 'id,author.email'."""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in filter(None, path.strip().split('.')):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def check_field_paths(
+    tree: dict, serializer: serializers.Serializer, prefix: str = ''
+) -> list[str]:
+    """Error messages of paths in tree which serializer does not have."""
+    fields = serializer.fields
+    errors = []
+    for name, subtree in tree.items():
+        field = fields.get(name)
+        if field is None:
+            errors.append(
+                f'Unknown field `{prefix}{name}`, valid fields: '
+                f'{", ".join(fields)}.'
+            )
+            continue
+        nested = getattr(field, 'child', field)
+        if not subtree:
+            continue
+        if not isinstance(nested, serializers.Serializer):
+            errors.append(f'Field `{prefix}{name}` has no subfields.')
+            continue
+        errors.extend(check_field_paths(subtree, nested, f'{prefix}{name}.'))
+    return errors
+
+
+class FieldSelection:
+    """Requested fields and expanded relations on one nesting level.
+
+    fields is None when every field is requested, an empty subtree of
+    a requested relation means all its fields. expand is None when
+    every relation is expanded, which keeps responses without
+    parameters unchanged. Relations with requested subfields are
+    always expanded.
+    """
+
+    def __init__(self, fields: dict | None = None, expand: dict | None = None):
+        self.fields = fields
+        self.expand = expand
+
+    @classmethod
+    def from_request(cls, request) -> 'FieldSelection':
+        params = request.query_params
+        return cls(
+            parse_field_paths(params[FIELDS_PARAM]) or None
+            if FIELDS_PARAM in params else None,
+            parse_field_paths(params[EXPAND_PARAM])
+            if EXPAND_PARAM in params else None,
+        )
+
+    def includes(self, name: str) -> bool:
+        """Whether field is in output."""
+        return self.fields is None or name in self.fields
+
+    def expands(self, name: str) -> bool:
+        """Whether relation is nested object instead of primary key."""
+        return self.includes(name) and (
+            self.expand is None
+            or name in self.expand
+            or bool(self.fields and self.fields[name])
+        )
+
+    def child(self, name: str) -> 'FieldSelection':
+        """Selection of nested relation."""
+        return FieldSelection(
+            self.fields[name] or None if self.fields is not None else None,
+            self.expand.get(name, {}) if self.expand is not None else None,
+        )
+
+    def columns(
+        self, column_map: dict[str, tuple[str, ...]], prefix: str = ''
+    ) -> list[str]:
+        """Model columns of requested fields for only()."""
+        return [
+            f'{prefix}{column}'
+            for name, columns in column_map.items()
+            if self.includes(name)
+            for column in columns
+        ]
+
+
+class SparseFieldsetMixin:
+    """Serializer mixin which keeps only requested fields.
+
+    Relations from Meta.expandable_fields which are not expanded are
+    rendered as primary keys, read from the foreign key column.
+    """
+
+    @property
+    def field_selection(self) -> FieldSelection | None:
+        """Selection of this serializer from root context."""
+        selection = self.context.get(FIELD_SELECTION_CONTEXT)
+        if selection is None:
+            return None
+        path = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                path.append(node.field_name)
+            node = node.parent
+        for name in reversed(path):
+            selection = selection.child(name)
+        return selection
+
+    def get_fields(self) -> dict:
+        fields = super().get_fields()
+        selection = self.field_selection
+        if selection is None:
+            return fields
+        for name, field in list(fields.items()):
+            if not selection.includes(name):
+                del fields[name]
+            elif (
+                name in getattr(self.Meta, 'expandable_fields', ())
+                and not selection.expands(name)
+            ):
+                fields[name] = serializers.PrimaryKeyRelatedField(
+                    read_only=True,
+                    many=isinstance(field, serializers.ListSerializer),
+                    **({'source': field.source} if field.source else {}),
+                )
+        return fields
+
+
+class LeanField(NamedTuple):
+    """Columns of .values() row and function building output value."""
+
+    columns: tuple[str, ...]
+    build: Callable[[dict, str], Any]
+
+
+def lean_column(column: str) -> LeanField:
+    """Output value is the column value."""
+    return LeanField((column,), lambda row, prefix: row[prefix + column])
+
+
+def lean_datetime(column: str) -> LeanField:
+    """Datetime column formatted like DateTimeField."""
+    field = serializers.DateTimeField()
+
+    def build(row, prefix):
+        value = row[prefix + column]
+        return None if value is None else field.to_representation(value)
+
+    return LeanField((column,), build)
+
+
+class LeanSerializer:
+    """Read-only serializer of .values() rows without DRF fields.
+
+    fields map output names to LeanField, relations map output names
+    to foreign key column and LeanSerializer of related model, or None
+    when only primary key is supported. Fields missing from both are
+    not supported, the regular serializer is used for requests which
+    select them. Output follows order.
+    """
+
+    fields: dict[str, LeanField] = {}
+    relations: dict[str, tuple[str, type['LeanSerializer'] | None]] = {}
+    order: tuple[str, ...] = ()
+
+    def __init__(self, selection: FieldSelection, prefix: str = ''):
+        self.selection = selection
+        self.prefix = prefix
+
+    @classmethod
+    def supports(cls, selection: FieldSelection) -> bool:
+        """Whether every requested field can be built from row."""
+        for name in cls.order:
+            if not selection.includes(name) or name in cls.fields:
+                continue
+            if name not in cls.relations:
+                return False
+            nested_class = cls.relations[name][1]
+            if selection.expands(name) and (
+                nested_class is None
+                or not nested_class.supports(selection.child(name))
+            ):
+                return False
+        return True
+
+    @cached_property
+    def builders(self) -> list[tuple[str, Callable[[dict], Any]]]:
+        """Output names with functions building values from row."""
+        builders = []
+        for name in self.order:
+            if not self.selection.includes(name):
+                continue
+            if name in self.fields:
+                build = self.fields[name].build
+                builders.append((name, lambda row, b=build: b(row, self.prefix)))
+                continue
+            column, nested_class = self.relations[name]
+            column = self.prefix + column
+            if not self.selection.expands(name):
+                builders.append((name, lambda row, c=column: row[c]))
+                continue
+            nested = nested_class(
+                self.selection.child(name), prefix=f'{column}__'
+            )
+            builders.append((
+                name,
+                lambda row, c=column, n=nested: (
+                    None if row[c] is None else n.to_representation(row)
+                ),
+            ))
+        return builders
+
+    def columns(self) -> list[str]:
+        """Columns for .values() of requested fields."""
+        columns = []
+        for name in self.order:
+            if not self.selection.includes(name):
+                continue
+            if name in self.fields:
+                columns.extend(
+                    self.prefix + column
+                    for column in self.fields[name].columns
+                )
+                continue
+            column, nested_class = self.relations[name]
+            columns.append(self.prefix + column)
+            if self.selection.expands(name):
+                columns.extend(nested_class(
+                    self.selection.child(name),
+                    prefix=f'{self.prefix}{column}__',
+                ).columns())
+        return columns
+
+    def to_representation(self, row: dict) -> dict:
+        return {name: build(row) for name, build in self.builders}
+
+
+class SparseFieldsetViewMixin:
+    """ViewSet mixin which passes ?fields= and ?expand= to serializers.
+
+    List requests which lean_serializer_class supports are served from
+    .values() rows of get_queryset() without model instances.
+    """
+
+    sparse_fieldset_actions = ('list', 'retrieve')
+    lean_serializer_class = None
+    lean_ordering_columns = ('id', 'created_at')
+
+    @cached_property
+    def field_selection(self) -> FieldSelection:
+        """Selection of request, unknown field names give 400."""
+        selection = FieldSelection.from_request(self.request)
+        if selection.fields is None and not selection.expand:
+            return selection
+        serializer = self.get_serializer_class()()
+        errors = {
+            param: messages
+            for param, tree in (
+                (FIELDS_PARAM, selection.fields),
+                (EXPAND_PARAM, selection.expand),
+            )
+            if tree and (messages := check_field_paths(tree, serializer))
+        }
+        if errors:
+            raise ValidationError(errors)
+        return selection
+
+    def get_serializer_context(self) -> dict:
+        context = super().get_serializer_context()
+        if self.action in self.sparse_fieldset_actions:
+            context[FIELD_SELECTION_CONTEXT] = self.field_selection
+        return context
+
+    def list(self, request, *args, **kwargs):
+        if (
+            self.lean_serializer_class is None
+            or not self.lean_serializer_class.supports(self.field_selection)
+        ):
+            return super().list(request, *args, **kwargs)
+        serializer = self.lean_serializer_class(self.field_selection)
+        rows = self.filter_queryset(self.get_queryset()).values(
+            *dict.fromkeys((
+                *serializer.columns(), *self.lean_ordering_columns
+            ))
+        )
+        page = self.paginate_queryset(rows)
+        with timed('serialize_time'):
+            data = [
+                serializer.to_representation(row)
+                for row in (rows if page is None else page)
+            ]
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
@@ -0,0 +1,46 @@
+from django.db.models import F
+from rest_framework.filters import BaseFilterBackend
+
+from server.api.serializers import CollectFilterSerializer
+
+
+class CollectFilterBackend(BaseFilterBackend):
+    """Filter collects list by query parameters.
+
+    Parameters are validated by CollectFilterSerializer and map to
+    lookups, search and title use full-text search and typeahead of
+    CollectQuerySet. Bounds of current_amount include counter shards
+    which are not rolled up yet, like the amount in response. Cache
+    keys include the query string, so every filtered list is cached
+    separately.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if view.action != 'list':
+            return queryset
+        serializer = CollectFilterSerializer(
+            data=request.query_params, partial=True
+        )
+        serializer.is_valid(raise_exception=True)
+        params = dict(serializer.validated_data)
+        if 'reason' in params:
+            params['reason__in'] = params.pop('reason')
+        search = params.pop('search', None)
+        title = params.pop('title', None)
+        live_bounds = {
+            lookup.replace('current_amount', 'live_amount'): params.pop(lookup)
+            for lookup in ('current_amount__gte', 'current_amount__lte')
+            if lookup in params
+        }
+        if live_bounds:
+            if 'shard_amount' not in queryset.query.annotations:
+                queryset = queryset.with_live_totals()
+            queryset = queryset.alias(
+                live_amount=F('current_amount') + F('shard_amount')
+            ).filter(**live_bounds)
+        queryset = queryset.filter(**params)
+        if search:
+            queryset = queryset.search(search)
+        if title:
+            queryset = queryset.typeahead(title)
+        return queryset
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    ScryptPasswordHasher,
+)
+
+ARGON2_COST = settings.PASSWORD_HASHER_COST['argon2']
+SCRYPT_COST = settings.PASSWORD_HASHER_COST['scrypt']
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2id with cost from settings.
+
+    Hashes with other cost are updated on next successful login.
+    """
+
+    time_cost = ARGON2_COST['time_cost']
+    memory_cost = ARGON2_COST['memory_cost']
+    parallelism = ARGON2_COST['parallelism']
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    """Scrypt with cost from settings, needs no extra packages.
+
+    maxmem only limits memory, it lets work factors above the OpenSSL
+    default limit of 32 MiB verify. Hashes with other cost are updated
+    on next successful login.
+    """
+
+    work_factor = SCRYPT_COST['work_factor']
+    block_size = SCRYPT_COST['block_size']
+    parallelism = SCRYPT_COST['parallelism']
+    maxmem = 2 ** 30
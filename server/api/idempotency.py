@@ -0,0 +1,137 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from server.api.redis_utils import get_redis_client
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_KEY = 'idempotency:{user_id}:{key}'
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+PENDING = 'pending'
+
+# Returns stored entry, or claims key with pending entry and returns nil.
+CLAIM_SCRIPT = """
+local entry = redis.call('GET', KEYS[1])
+if entry then
+    return entry
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return false
+"""
+
+
+class IdempotencyConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Request with this Idempotency-Key is in progress.'
+    default_code = 'idempotency_conflict'
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'Idempotency-Key was used for another request.'
+    default_code = 'idempotency_key_reused'
+
+
+def request_fingerprint(request) -> str:
+    """Hash of path and parsed body of request."""
+    return hashlib.sha256(
+        json.dumps(
+            [request.path, request.data], cls=JSONEncoder, sort_keys=True
+        ).encode()
+    ).hexdigest()
+
+
+def claim_key(key: str, entry: str) -> str | None:
+    """Stored entry of key, or None after claiming it with entry."""
+    redis_client = get_redis_client()
+    if redis_client is None:
+        # Entry may expire between add and get, then add is retried.
+        while not cache.add(key, entry, settings.IDEMPOTENCY_PENDING_TTL):
+            stored = cache.get(key)
+            if stored is not None:
+                return stored
+        return None
+    stored = redis_client.register_script(CLAIM_SCRIPT)(
+        keys=[key], args=[entry, settings.IDEMPOTENCY_PENDING_TTL]
+    )
+    return stored.decode() if stored is not None else None
+
+
+def store_key(key: str, entry: str | None) -> None:
+    """Save finished response of key or release it with None."""
+    redis_client = get_redis_client()
+    if redis_client is None:
+        if entry is None:
+            cache.delete(key)
+        else:
+            cache.set(key, entry, settings.IDEMPOTENCY_KEY_TTL)
+    elif entry is None:
+        redis_client.delete(key)
+    else:
+        redis_client.set(key, entry, ex=settings.IDEMPOTENCY_KEY_TTL)
+
+
+def idempotent(handler):
+    """Replay first response of requests with same Idempotency-Key.
+
+    Key is claimed atomically before the handler runs, so concurrent
+    retries get 409 instead of creating duplicates. Errors are not
+    stored, so failed request can be retried with the same key.
+    """
+
+    @wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return handler(self, request, *args, **kwargs)
+        if not 0 < len(key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise ValidationError({IDEMPOTENCY_HEADER: (
+                f'Key must have 1 to {IDEMPOTENCY_KEY_MAX_LENGTH} characters.'
+            )})
+        key = IDEMPOTENCY_KEY.format(user_id=request.user.pk, key=key)
+        fingerprint = request_fingerprint(request)
+        stored = claim_key(key, json.dumps(
+            {'state': PENDING, 'fingerprint': fingerprint}
+        ))
+        if stored is not None:
+            return replay(json.loads(stored), fingerprint)
+        try:
+            response = handler(self, request, *args, **kwargs)
+        except Exception:
+            store_key(key, None)
+            raise
+        if response.status_code >= status.HTTP_400_BAD_REQUEST:
+            store_key(key, None)
+            return response
+        store_key(key, json.dumps(
+            {
+                'state': 'done',
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                'data': response.data,
+            },
+            cls=JSONEncoder,
+        ))
+        return response
+
+    return wrapper
+
+
+def replay(entry: dict, fingerprint: str) -> Response:
+    """Stored response of finished request."""
+    if entry['fingerprint'] != fingerprint:
+        raise IdempotencyKeyReused()
+    if entry['state'] == PENDING:
+        raise IdempotencyConflict()
+    return Response(
+        entry['data'],
+        status=entry['status'],
+        headers={'Idempotent-Replayed': 'true'},
+    )
@@ -0,0 +1,96 @@
+import base64
+import binascii
+import io
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+BASE64_MARKER = ';base64,'
+BASE64_CHUNK_SIZE = 64 * 1024
+VARIANTS_PATH = 'collect_image/variants/{pk}/{name}.{extension}'
+VARIANT_FORMATS = {'webp': 'WEBP', 'avif': 'AVIF'}
+
+
+class ImageHeaderError(ValueError):
+    """Image can not be accepted judging by its header."""
+
+
+def decode_base64_image(data: str) -> File:
+    """Decode data URI chunk by chunk into a spooled temporary file."""
+    marker = data.index(BASE64_MARKER)
+    extension = data[:marker].split('/')[-1]
+    file = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    start = marker + len(BASE64_MARKER)
+    try:
+        for offset in range(start, len(data), BASE64_CHUNK_SIZE):
+            file.write(base64.b64decode(
+                data[offset:offset + BASE64_CHUNK_SIZE], validate=True
+            ))
+    except binascii.Error as error:
+        file.close()
+        raise ImageHeaderError('Invalid base64 image data.') from error
+    file.seek(0)
+    return File(file, name=f'upload.{extension}')
+
+
+def check_image_header(file) -> None:
+    """Validate format and pixel dimensions without decoding pixels."""
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            width, height = image.size
+            image_format = image.format
+    except (UnidentifiedImageError, Image.DecompressionBombError) as error:
+        raise ImageHeaderError('Upload a valid image.') from error
+    finally:
+        file.seek(0)
+    if image_format not in settings.COLLECT_IMAGE_FORMATS:
+        raise ImageHeaderError(f'Image format {image_format} is not allowed.')
+    if (
+        max(width, height) > settings.COLLECT_IMAGE_MAX_SIDE
+        or width * height > settings.COLLECT_IMAGE_MAX_PIXELS
+    ):
+        raise ImageHeaderError(
+            f'Image {width}x{height} is bigger than allowed.'
+        )
+
+
+def build_image_variants(collect) -> dict[str, dict[str, str]]:
+    """Resize collect image and store WebP/AVIF variants.
+
+    Returns storage paths of variants by name and format.
+    """
+    formats = [
+        extension for extension in VARIANT_FORMATS
+        if extension != 'avif' or features.check('avif')
+    ]
+    variants = {}
+    with collect.image.open('rb') as file, Image.open(file) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA')
+        for name, side in settings.COLLECT_IMAGE_VARIANTS.items():
+            image = original.copy()
+            image.thumbnail((side, side))
+            variants[name] = {}
+            for extension in formats:
+                buffer = io.BytesIO()
+                image.save(
+                    buffer,
+                    VARIANT_FORMATS[extension],
+                    quality=settings.COLLECT_IMAGE_QUALITY,
+                )
+                path = VARIANTS_PATH.format(
+                    pk=collect.pk, name=name, extension=extension
+                )
+                default_storage.delete(path)
+                variants[name][extension] = default_storage.save(
+                    path, ContentFile(buffer.getvalue())
+                )
+    return variants
@@ -0,0 +1,334 @@
+import ipaddress
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.functional import empty
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+CACHE_RESULTS = ('hits', 'misses', 'bytes')
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    """Timings and counters of one request."""
+
+    def __init__(self, collect_queries: bool):
+        self.started = time.perf_counter()
+        self.db_count = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.render_time = 0.0
+        self.cache = {}
+        self.queries = [] if collect_queries else None
+
+    def add_cache_access(self, tier: str, hit: bool, size: int) -> None:
+        """Count cache access of tier and its payload size."""
+        counters = self.cache.setdefault(
+            tier, dict.fromkeys(CACHE_RESULTS, 0)
+        )
+        counters['hits' if hit else 'misses'] += 1
+        counters['bytes'] += size
+
+    def server_timing(self, total: float) -> str:
+        """Value of Server-Timing header."""
+        metrics = [
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.db_count} queries"',
+            f'serialize;dur={self.serialize_time * 1000:.1f}',
+            f'render;dur={self.render_time * 1000:.1f}',
+        ]
+        for tier, counters in self.cache.items():
+            metrics.append(
+                f'cache-{tier};desc="{counters["hits"]} hits '
+                f'{counters["misses"]} misses {counters["bytes"]} bytes"'
+            )
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+class MetricsRegistry:
+    """Per-worker counters and latency histograms by viewset action."""
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._counters = {}
+
+    def observe(self, labels: tuple, metrics: RequestMetrics, total: float):
+        """Add finished request to histogram and counters."""
+        with self._lock:
+            histogram = self._latency.setdefault(
+                labels, {'buckets': [0] * len(self.buckets), 'sum': 0.0}
+            )
+            for index, bound in enumerate(self.buckets):
+                if total <= bound:
+                    histogram['buckets'][index] += 1
+            histogram['sum'] += total
+            histogram['count'] = histogram.get('count', 0) + 1
+            for name, value in (
+                ('db_queries_total', metrics.db_count),
+                ('db_query_seconds_total', metrics.db_time),
+                ('serialize_seconds_total', metrics.serialize_time),
+                ('render_seconds_total', metrics.render_time),
+            ):
+                key = (name, labels)
+                self._counters[key] = self._counters.get(key, 0) + value
+            for tier, counters in metrics.cache.items():
+                for result, value in counters.items():
+                    key = (f'cache_{result}_total', (('tier', tier),))
+                    self._counters[key] = self._counters.get(key, 0) + value
+
+    def render(self) -> str:
+        """Metrics in Prometheus text exposition format."""
+        lines = ['# TYPE http_request_duration_seconds histogram']
+        with self._lock:
+            for labels, histogram in sorted(self._latency.items()):
+                for bound, count in zip(self.buckets, histogram['buckets']):
+                    lines.append(
+                        'http_request_duration_seconds_bucket'
+                        f'{format_labels(labels + (("le", bound),))} {count}'
+                    )
+                lines.extend((
+                    'http_request_duration_seconds_bucket'
+                    f'{format_labels(labels + (("le", "+Inf"),))} '
+                    f'{histogram["count"]}',
+                    'http_request_duration_seconds_sum'
+                    f'{format_labels(labels)} {histogram["sum"]}',
+                    'http_request_duration_seconds_count'
+                    f'{format_labels(labels)} {histogram["count"]}',
+                ))
+            types_written = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in types_written:
+                    lines.append(f'# TYPE {name} counter')
+                    types_written.add(name)
+                lines.append(f'{name}{format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels: tuple) -> str:
+    """Prometheus label set from (name, value) pairs."""
+    return '{' + ','.join(
+        f'{name}="{value}"' for name, value in labels
+    ) + '}'
+
+
+registry = MetricsRegistry(LATENCY_BUCKETS)
+
+
+def payload_size(value) -> int:
+    """Size of rendered body of cached value, 0 for data entries.
+
+    Data entries are not pickled again just to be measured, that would
+    cost as much as the cache hit saves.
+    """
+    if isinstance(value, dict) and isinstance(value.get('body'), bytes):
+        return len(value['body'])
+    return 0
+
+
+def record_cache_metrics(tier: str, hit: bool, value=None) -> None:
+    """Add cache access to metrics of current request."""
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.add_cache_access(tier, hit, payload_size(value) if hit else 0)
+
+
+@contextmanager
+def timed(attribute: str):
+    """Add duration of block to timing attribute of current request."""
+    metrics = current_metrics.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(
+            metrics,
+            attribute,
+            getattr(metrics, attribute) + time.perf_counter() - started,
+        )
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper which counts and times queries."""
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        metrics.db_count += 1
+        metrics.db_time += duration
+        if metrics.queries is not None:
+            metrics.queries.append((duration, sql))
+
+
+def install_query_recorder(sender, connection, **kwargs) -> None:
+    """Add execute wrapper to every new database connection."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def loaded_user(request):
+    """User of request if it is already loaded, else None.
+
+    Lazy session user is not loaded here, it would query the database
+    and fail in async context.
+    """
+    user = getattr(request, 'user', None)
+    if getattr(user, '_wrapped', None) is empty:
+        return None
+    return user
+
+
+def is_metrics_client(request) -> bool:
+    """Whether request comes from allowed network or staff user."""
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        address = None
+    if address is not None and any(
+        address in ipaddress.ip_network(network)
+        for network in settings.METRICS_ALLOWED_NETWORKS
+    ):
+        return True
+    return request.user.is_staff
+
+
+def metrics_view(request):
+    """Metrics of this worker in Prometheus text format.
+
+    Only scrapers from METRICS_ALLOWED_NETWORKS and staff users get
+    them.
+    """
+    if not is_metrics_client(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render(), content_type='text/plain; version=0.0.4'
+    )
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer which reports render time of request."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render_time'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class InstrumentedViewMixin:
+    """Mixin for timing serialization of response data."""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        to_representation = serializer.to_representation
+
+        def timed_representation(instance):
+            with timed('serialize_time'):
+                return to_representation(instance)
+
+        serializer.to_representation = timed_representation
+        return serializer
+
+
+class InstrumentationMiddleware:
+    """Records request metrics, adds Server-Timing header.
+
+    Queries of slow requests are logged for sampled requests.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = self.start()
+        token = current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = self.start()
+        token = current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    @staticmethod
+    def start() -> RequestMetrics:
+        """Metrics of new request, sampled ones collect queries."""
+        return RequestMetrics(
+            collect_queries=(
+                random.random() < settings.INSTRUMENTATION['SLOW_SAMPLE_RATE']
+            )
+        )
+
+    def finish(self, request, response, metrics: RequestMetrics):
+        """Publish metrics of finished request."""
+        total = time.perf_counter() - metrics.started
+        labels = self.labels(request)
+        registry.observe(labels, metrics, total)
+        if settings.INSTRUMENTATION['SERVER_TIMING'] or getattr(
+            loaded_user(request), 'is_staff', False
+        ):
+            response['Server-Timing'] = metrics.server_timing(total)
+        if (
+            metrics.queries is not None
+            and total * 1000 >= settings.INSTRUMENTATION['SLOW_REQUEST_MS']
+        ):
+            logger.warning(
+                'Slow request %s %s %.1fms, %s queries in %.1fms:\n%s',
+                request.method,
+                request.path,
+                total * 1000,
+                metrics.db_count,
+                metrics.db_time * 1000,
+                '\n'.join(
+                    f'{duration * 1000:.1f}ms {sql}'
+                    for duration, sql in metrics.queries
+                ),
+            )
+        return response
+
+    @staticmethod
+    def labels(request) -> tuple:
+        """Viewset and action of request for metric labels."""
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return (('view', 'unresolved'), ('action', request.method))
+        view = getattr(match.func, 'cls', None)
+        actions = getattr(match.func, 'actions', None) or {}
+        return (
+            ('view', view.__name__ if view else match.view_name),
+            ('action', actions.get(request.method.lower(), request.method)),
+        )
@@ -0,0 +1,109 @@
+from collections.abc import Iterable
+
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+from server.api.redis_utils import get_redis_client
+from server.payment.models import Collect
+
+LEADERBOARD_KEYS = {
+    'amount': 'leaderboard:collects:amount',
+    'progress': 'leaderboard:collects:progress',
+}
+REBUILD_CHUNK_SIZE = 5000
+
+
+def leaderboard_scores(
+    current_amount: int, target_amount: int | None
+) -> dict[str, float]:
+    """Scores of collect in every leaderboard it belongs to."""
+    scores = {'amount': current_amount}
+    if target_amount:
+        scores['progress'] = current_amount / target_amount
+    return scores
+
+
+def update_leaderboards(
+    collects: Iterable[tuple[int, int, int | None]],
+    redis_client=None,
+    gt: bool = False,
+) -> None:
+    """Set scores of (pk, current_amount, target_amount) collects.
+
+    With gt=True scores only grow, so totals of donations committed
+    out of order do not overwrite a newer higher score.
+    """
+    redis_client = redis_client or get_redis_client()
+    if redis_client is None:
+        return
+    mappings = {board: {} for board in LEADERBOARD_KEYS}
+    for pk, current_amount, target_amount in collects:
+        for board, score in leaderboard_scores(
+            current_amount, target_amount
+        ).items():
+            mappings[board][pk] = score
+    pipeline = redis_client.pipeline(transaction=False)
+    for board, mapping in mappings.items():
+        if mapping:
+            pipeline.zadd(LEADERBOARD_KEYS[board], mapping, gt=gt)
+    pipeline.execute()
+
+
+def remove_from_leaderboards(pk: int) -> None:
+    """Delete collect from every leaderboard."""
+    redis_client = get_redis_client()
+    if redis_client is None:
+        return
+    pipeline = redis_client.pipeline(transaction=False)
+    for key in LEADERBOARD_KEYS.values():
+        pipeline.zrem(key, pk)
+    pipeline.execute()
+
+
+def top_collects(board: str, limit: int) -> list[tuple[int, float]]:
+    """Top collects of leaderboard with scores.
+
+    ZREVRANGE costs O(log n + limit) in Redis. Without Redis the
+    collects are ordered in the database.
+    """
+    redis_client = get_redis_client()
+    if redis_client is not None:
+        return [
+            (int(pk), score) for pk, score in redis_client.zrevrange(
+                LEADERBOARD_KEYS[board], 0, limit - 1, withscores=True
+            )
+        ]
+    queryset = Collect.objects.with_live_totals().annotate(
+        total=F('current_amount') + F('shard_amount')
+    )
+    if board == 'progress':
+        queryset = queryset.filter(target_amount__gt=0).annotate(
+            score=Cast('total', FloatField()) / F('target_amount')
+        )
+    else:
+        queryset = queryset.annotate(score=Cast('total', FloatField()))
+    return list(
+        queryset.order_by('-score', 'pk').values_list('pk', 'score')[:limit]
+    )
+
+
+def rebuild_leaderboards() -> int:
+    """Fill leaderboards from database, return count of collects."""
+    redis_client = get_redis_client()
+    if redis_client is None:
+        return 0
+    redis_client.delete(*LEADERBOARD_KEYS.values())
+    count = 0
+    chunk = []
+    for collect in Collect.objects.with_live_totals().only(
+        'pk', 'current_amount', 'target_amount'
+    ).order_by('pk').iterator(chunk_size=REBUILD_CHUNK_SIZE):
+        chunk.append((
+            collect.pk, collect.live_current_amount, collect.target_amount
+        ))
+        if len(chunk) == REBUILD_CHUNK_SIZE:
+            update_leaderboards(chunk, redis_client)
+            count += len(chunk)
+            chunk = []
+    update_leaderboards(chunk, redis_client)
+    return count + len(chunk)
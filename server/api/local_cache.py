@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCache:
+    """Per-worker LRU cache with entry limit and short TTL."""
+
+    def __init__(self, max_entries: int, timeout: float):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """Return value or None when key is missing or expired."""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value) -> None:
+        """Store value, evicting least recently used entries."""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_prefix(self, prefix: str) -> None:
+        """Delete every key which starts with prefix."""
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        """Delete every entry."""
+        with self._lock:
+            self._entries.clear()
+
+
+class InvalidationListener:
+    """Background subscriber which drops local entries of resources."""
+
+    def __init__(self, local_cache: LocalCache, channel: str):
+        self.local_cache = local_cache
+        self.channel = channel
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self, redis_client) -> None:
+        """Start listener thread once per process."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._listen,
+                args=(redis_client,),
+                name='cache-invalidation-listener',
+                daemon=True,
+            )
+            self._thread.start()
+
+    def _listen(self, redis_client) -> None:
+        """Receive invalidation messages until process exits."""
+        while True:
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                self.local_cache.clear()
+                for message in pubsub.listen():
+                    self.local_cache.delete_prefix(
+                        f'{message["data"].decode()}:'
+                    )
+            except Exception:
+                logger.exception('Cache invalidation listener failed')
+                self.local_cache.clear()
+                time.sleep(1)
+
+
+local_cache = LocalCache(
+    max_entries=settings.CACHE_LOCAL_TIER['MAX_ENTRIES'],
+    timeout=settings.CACHE_LOCAL_TIER['TIMEOUT'],
+)
+invalidation_listener = InvalidationListener(
+    local_cache, settings.CACHE_INVALIDATION_CHANNEL
+)
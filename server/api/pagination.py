@@ -0,0 +1,155 @@
+from typing import override
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+from rest_framework.pagination import (
+    BasePagination,
+    CursorPagination,
+    PageNumberPagination,
+)
+from rest_framework.response import Response
+
+from server.payment.models import RECENT_PAYMENTS_ORDERING
+
+CURSOR_MODE = 'cursor'
+PAGINATION_MODE_PARAM = 'pagination'
+WITH_COUNT_PARAM = 'with_count'
+
+
+def estimate_count(queryset: QuerySet) -> int:
+    """Count rows, estimating unfiltered big PostgreSQL tables.
+
+    Uses planner statistics from pg_class when estimate is bigger than
+    API_APPROXIMATE_COUNT_THRESHOLD, exact COUNT(*) otherwise.
+    """
+    threshold = settings.API_APPROXIMATE_COUNT_THRESHOLD
+    connection = connections[queryset.db]
+    if (
+        threshold
+        and connection.vendor == 'postgresql'
+        and not queryset.query.where
+    ):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= threshold:
+            return row[0]
+    return queryset.count()
+
+
+class ApproximateCountPaginator(Paginator):
+    """Django paginator with estimated count for big tables."""
+
+    @cached_property
+    def count(self) -> int:
+        """Total count of objects, estimated for big tables."""
+        if isinstance(self.object_list, QuerySet):
+            return estimate_count(self.object_list)
+        return super().count
+
+
+class ApproximateCountPagination(PageNumberPagination):
+    """Page number pagination which may estimate total count."""
+
+    django_paginator_class = ApproximateCountPaginator
+
+
+class CreatedCursorPagination(CursorPagination):
+    """Keyset pagination on (created_at, id) for list endpoints."""
+
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    @override
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(WITH_COUNT_PARAM):
+            self.count = estimate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    @override
+    def get_paginated_response(self, data) -> Response:
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data['count'] = self.count
+        return response
+
+
+class CollectPaymentsPagination(CreatedCursorPagination):
+    """Keyset pagination for payments of one collect."""
+
+    ordering = RECENT_PAYMENTS_ORDERING
+
+
+class SwitchablePagination(BasePagination):
+    """Page number pagination with opt-in cursor mode.
+
+    Cursor mode is used for `?pagination=cursor`, requests with cursor
+    and when API_PAGINATION_MODE setting is `cursor`. Querysets with
+    own ordering, like search results by relevance, always get page
+    numbers, cursor ordering would replace theirs.
+    """
+
+    page_pagination_class = ApproximateCountPagination
+    cursor_pagination_class = CreatedCursorPagination
+
+    def __init__(self):
+        self.paginator = self.page_pagination_class()
+
+    @property
+    def display_page_controls(self) -> bool:
+        """Whether browsable API should render page controls."""
+        return getattr(self.paginator, 'display_page_controls', False)
+
+    @override
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.is_cursor_mode(request) and not queryset.query.order_by:
+            self.paginator = self.cursor_pagination_class()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    @override
+    def get_paginated_response(self, data) -> Response:
+        return self.paginator.get_paginated_response(data)
+
+    @override
+    def get_paginated_response_schema(self, schema):
+        return self.paginator.get_paginated_response_schema(schema)
+
+    @override
+    def get_schema_operation_parameters(self, view):
+        return [
+            *self.page_pagination_class().get_schema_operation_parameters(
+                view
+            ),
+            *self.cursor_pagination_class().get_schema_operation_parameters(
+                view
+            ),
+            {
+                'name': PAGINATION_MODE_PARAM,
+                'required': False,
+                'in': 'query',
+                'description': 'Use `cursor` for keyset pagination.',
+                'schema': {'type': 'string', 'enum': [CURSOR_MODE]},
+            },
+        ]
+
+    @override
+    def to_html(self):
+        return self.paginator.to_html()
+
+    @staticmethod
+    def is_cursor_mode(request) -> bool:
+        """Check whether request asks for cursor pagination."""
+        return (
+            settings.API_PAGINATION_MODE == CURSOR_MODE
+            or request.query_params.get(PAGINATION_MODE_PARAM) == CURSOR_MODE
+            or CreatedCursorPagination.cursor_query_param
+            in request.query_params
+        )
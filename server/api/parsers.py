@@ -0,0 +1,29 @@
+import codecs
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """Parses newline delimited JSON into list of objects."""
+
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Decode stream line by line, blank lines are skipped."""
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        rows = []
+        try:
+            for number, line in enumerate(
+                codecs.getreader(encoding)(stream), start=1
+            ):
+                if line.strip():
+                    rows.append(json.loads(line))
+        except ValueError as error:
+            raise ParseError(
+                f'NDJSON parse error on line {number} - {error}'
+            ) from error
+        return rows
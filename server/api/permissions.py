@@ -16,4 +16,18 @@ class AuthorOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in permissions.SAFE_METHODS:
             return True
-        return request.user and (request.user.is_superuser or obj.user == request.user)
+        return request.user and (
+            request.user.is_superuser or obj.user_id == request.user.id
+        )
+
+
+class AuthorOnly(permissions.BasePermission):
+    """Only author can access instance, even for reading."""
+
+    @override
+    def has_permission(self, request, view):
+        return request.user and request.user.is_authenticated
+
+    @override
+    def has_object_permission(self, request, view, obj):
+        return request.user.is_superuser or obj.user_id == request.user.id
@@ -0,0 +1,30 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+
+def get_redis_client():
+    """Raw Redis client of default cache or None for other backends."""
+    if not settings.CACHES['default']['BACKEND'].startswith('django_redis'):
+        return None
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+def on_commit_redis(func, *args, **kwargs) -> None:
+    """Call func after commit, logging its Redis errors.
+
+    Data is already committed then, so unavailable Redis must not turn
+    the response into a server error.
+    """
+    def callback():
+        try:
+            func(*args, **kwargs)
+        except RedisError:
+            logger.exception('Redis update %s failed', func.__name__)
+
+    transaction.on_commit(callback)
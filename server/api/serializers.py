@@ -1,10 +1,29 @@
-import base64
-from datetime import datetime
 from typing import override
 
-from django.core.files.base import ContentFile
+from django.contrib.auth import password_validation
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
+from server.api.exports import EXPORT_WRITERS
+from server.api.fieldsets import (
+    LeanField,
+    LeanSerializer,
+    SparseFieldsetMixin,
+    lean_column,
+    lean_datetime,
+)
+from server.api.images import (
+    ImageHeaderError, check_image_header, decode_base64_image
+)
+from server.api.leaderboard import LEADERBOARD_KEYS, update_leaderboards
+from server.api.redis_utils import on_commit_redis
+from server.api.tasks import record_donation_stats
+from server.payment.choices import ReasonChoices
 from server.payment.models import Collect, Payment, User
 
 VALIDATION_MESSAGE = (
@@ -15,17 +34,31 @@ VALIDATION_MESSAGE = (
 CLOSED_COLLECT_MESSAGE = (
     'Collect `{title}` is closed! Thanks for your generosity!'
 )
+COLLECT_NOT_FOUND_MESSAGE = 'Collect with id {pk} does not exist.'
+PAYMENT_BULK_BATCH_SIZE = 1000
+STATS_MAX_LIMIT = 100
+STATS_MAX_HOURS = 24 * 31
+SEARCH_MAX_LENGTH = 200
+COLLECT_RANGE_FIELDS = ('target_amount', 'current_amount', 'created_at')
+RANGE_MESSAGE = 'Upper bound of {field} is less than lower bound.'
 
 
 class Base64ImageField(serializers.ImageField):
-    """ImageField for bs64."""
+    """ImageField for bs64.
+
+    Payload is decoded in chunks into a spooled temporary file and only
+    the image header is read here; resizing happens in a Celery task.
+    """
 
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith("data:image"):
-            format, imgstr = data.split(";base64,")
-            ext = format.split("/")[-1]
-            data = ContentFile(base64.b64decode(imgstr), name=f"upload.{ext}")
-        return super().to_internal_value(data)
+        try:
+            if isinstance(data, str) and data.startswith('data:image'):
+                data = decode_base64_image(data)
+            file = serializers.FileField.to_internal_value(self, data)
+            check_image_header(file)
+        except (ImageHeaderError, ValueError) as error:
+            raise serializers.ValidationError(str(error)) from error
+        return file
 
 
 class BaseUserSerializer(serializers.ModelSerializer):
@@ -45,6 +78,20 @@ class UserCreateSerializer(BaseUserSerializer):
         model = User
         fields = ('email', 'username', 'password')
 
+    @override
+    def validate(self, attrs: dict) -> dict:
+        """Check password with validators preloaded by ApiConfig."""
+        try:
+            password_validation.validate_password(
+                attrs['password'],
+                User(username=attrs['username'], email=attrs['email']),
+            )
+        except DjangoValidationError as error:
+            raise serializers.ValidationError(
+                {'password': list(error.messages)}
+            ) from error
+        return attrs
+
     @override
     def create(self, validated_data: dict[str, str | int]):
         """Custom method for creating user."""
@@ -55,12 +102,138 @@ class UserCreateSerializer(BaseUserSerializer):
         )
 
 
-class UserReadSerializer(BaseUserSerializer):
+class UserReadSerializer(SparseFieldsetMixin, BaseUserSerializer):
     class Meta:
         model = User
         fields = ('username', 'email')
 
 
+class LeanUserSerializer(LeanSerializer):
+    """Lean variant of UserReadSerializer."""
+
+    order = UserReadSerializer.Meta.fields
+    fields = {name: lean_column(name) for name in order}
+
+
+class PaymentBulkCreateSerializer(serializers.ListSerializer):
+    """List serializer for bulk payments with per-row results.
+
+    Invalid rows do not fail the whole list. Valid rows are checked
+    against running totals of locked collects in memory, inserted with
+    bulk_create and collects are updated by one grouped UPDATE.
+    """
+
+    @override
+    def to_internal_value(self, data) -> list[dict]:
+        if not isinstance(data, list):
+            self.fail_list('not_a_list', input_type=type(data).__name__)
+        if not data:
+            self.fail_list('empty')
+        if self.max_length is not None and len(data) > self.max_length:
+            self.fail_list('max_length', max_length=self.max_length)
+        rows = []
+        for item in data:
+            try:
+                rows.append(self.child.run_validation(item))
+            except serializers.ValidationError as error:
+                rows.append({'errors': error.detail})
+        return rows
+
+    def fail_list(self, key: str, **kwargs):
+        """Raise error of whole list like ListSerializer does."""
+        raise serializers.ValidationError(
+            {api_settings.NON_FIELD_ERRORS_KEY: [
+                self.error_messages[key].format(**kwargs)
+            ]},
+            code=key,
+        )
+
+    @override
+    def create(self, validated_data: list[dict]) -> list[dict]:
+        """Create accepted payments in one transaction."""
+        results = []
+        payments = []
+        changed = {}
+        now = timezone.now()
+        with transaction.atomic():
+            collects = Collect.objects.select_for_update().order_by(
+                'pk'
+            ).only(
+                'id', 'title', 'reason', 'target_amount', 'current_amount',
+                'donators_count', 'is_finished',
+            ).in_bulk({
+                row['collect_id'] for row in validated_data
+                if 'errors' not in row
+            })
+            for index, row in enumerate(validated_data):
+                errors = row.get('errors') or self.child.donation_errors(
+                    collects.get(row['collect_id']),
+                    row['collect_id'],
+                    row['amount'],
+                )
+                if errors:
+                    results.append({
+                        'index': index, 'status': 'rejected', 'errors': errors
+                    })
+                    continue
+                collect = collects[row['collect_id']]
+                collect.current_amount += row['amount']
+                collect.donators_count += 1
+                if (
+                    collect.target_amount is not None
+                    and collect.current_amount >= collect.target_amount
+                ):
+                    collect.is_finished = True
+                    collect.finished_at = now
+                changed[collect.pk] = collect
+                payments.append(Payment(**row))
+                results.append({'index': index, 'status': 'created'})
+            Payment.objects.bulk_create(
+                payments, batch_size=PAYMENT_BULK_BATCH_SIZE
+            )
+            if changed:
+                self.update_collects(changed.values(), now)
+                record_donation_stats(
+                    (
+                        (p.collect_id, collects[p.collect_id].reason, p.amount)
+                        for p in payments
+                    ),
+                    now,
+                )
+                on_commit_redis(update_leaderboards, [
+                    (c.pk, c.current_amount, c.target_amount)
+                    for c in changed.values()
+                ], gt=True)
+        created = iter(payments)
+        for result in results:
+            if result['status'] == 'created':
+                result['id'] = next(created).pk
+        return results
+
+    @staticmethod
+    def update_collects(collects, now) -> None:
+        """Write totals of all changed collects with one UPDATE."""
+        collects = list(collects)
+        finished = [collect for collect in collects if collect.is_finished]
+        Collect.objects.filter(pk__in=[c.pk for c in collects]).update(
+            current_amount=Case(*(
+                When(pk=c.pk, then=Value(c.current_amount)) for c in collects
+            )),
+            donators_count=Case(*(
+                When(pk=c.pk, then=Value(c.donators_count)) for c in collects
+            )),
+            is_finished=Case(
+                *(When(pk=c.pk, then=Value(True)) for c in finished),
+                default=F('is_finished'),
+            ),
+            finished_at=Case(
+                *(When(pk=c.pk, then=Value(now)) for c in finished),
+                default=F('finished_at'),
+            ),
+            updated_at=now,
+        )
+
+
 class PaymentCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating Payment instance."""
     collect_id = serializers.IntegerField()
@@ -68,54 +241,111 @@ class PaymentCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = ('collect_id', 'amount', 'comment')
+        list_serializer_class = PaymentBulkCreateSerializer
 
     @override
-    def validate(self, attrs: dict[str, str | int]) -> dict[str, str | int]:
-        collect = Collect.objects.get(pk=attrs['collect_id'])
-        donation_amount = attrs['amount']
-        target_amount = collect.target_amount
-        current_amount = collect.current_amount
+    def create(self, validated_data: dict[str, str | int]) -> Payment:
+        """Apply donation atomically and create payment in one transaction.
+
+        Collect checks are enforced by the conditional UPDATE, so the
+        collect row is read only when the donation is rejected.
+        """
+        collect_id = validated_data['collect_id']
+        with transaction.atomic():
+            result = Collect.objects.donate(
+                collect_id, validated_data['amount']
+            )
+            if result is None:
+                self.raise_rejected_donation(
+                    collect_id, validated_data['amount']
+                )
+            payment = Payment.objects.create(**validated_data)
+            record_donation_stats(
+                ((collect_id, result.reason, payment.amount),),
+                payment.created_at,
+            )
+            on_commit_redis(update_leaderboards, ((
+                collect_id, result.current_amount, result.target_amount
+            ),), gt=True)
+        payment.donation_result = result
+        return payment
+
+    @classmethod
+    def raise_rejected_donation(cls, collect_id: int, donation_amount: int):
+        """Raise validation error which explains rejected donation."""
+        raise serializers.ValidationError(cls.donation_errors(
+            Collect.objects.filter(pk=collect_id).first(),
+            collect_id,
+            donation_amount,
+            rejected=True,
+        ))
+
+    @staticmethod
+    def donation_errors(
+        collect: Collect | None,
+        collect_id: int,
+        donation_amount: int,
+        rejected: bool = False,
+    ) -> dict[str, str] | None:
+        """Errors of donation to collect state, None if it is accepted.
+
+        With rejected=True the donation is already rejected by the
+        database, so an open collect always gets the overflow message.
+        """
+        if collect is None:
+            return {
+                'collect_id': COLLECT_NOT_FOUND_MESSAGE.format(pk=collect_id)
+            }
         if collect.is_finished:
-            raise serializers.ValidationError({
+            return {
                 'message': CLOSED_COLLECT_MESSAGE.format(title=collect.title)
-            })
-        if (
-            target_amount is not None
-            and current_amount + donation_amount > target_amount
+            }
+        if not rejected and (
+            collect.target_amount is None
+            or collect.current_amount + donation_amount
+            <= collect.target_amount
         ):
-            raise serializers.ValidationError({
-                'amount': VALIDATION_MESSAGE.format(
-                    donation_amount=donation_amount,
-                    target_amount=target_amount,
-                    necessary_amount=target_amount - current_amount,
-                )
-            })
-        return attrs
-
-    @override
-    def create(self, validated_data: dict[str, str | int]) -> Payment:
-        collect = Collect.objects.get(pk=validated_data.pop('collect_id'))
-        payment = Payment.objects.create(collect=collect, **validated_data)
-        collect.current_amount += payment.amount
-        collect.donators_count += 1
-        if collect.target_amount == collect.current_amount:
-            collect.is_finished = True
-            collect.finished_at = datetime.now()
-        collect.save()
-        return payment
+            return None
+        return {
+            'amount': VALIDATION_MESSAGE.format(
+                donation_amount=donation_amount,
+                target_amount=collect.target_amount,
+                necessary_amount=(
+                    collect.target_amount - collect.current_amount
+                ),
+            )
+        }
 
 
-class PaymentShortSerializer(serializers.ModelSerializer):
+class PaymentShortSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = ('id', 'amount',)
 
 
-class CollectSerializer(serializers.ModelSerializer):
+class CollectPaymentSerializer(serializers.ModelSerializer):
+    """Serializer for payments page of one collect."""
+
+    class Meta:
+        model = Payment
+        fields = ('id', 'amount', 'comment', 'created_at')
+        read_only_fields = fields
+
+
+class CollectSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Collect instances."""
     author = UserReadSerializer(source='user', read_only=True)
     image = Base64ImageField(required=False, allow_null=True)
-    payments = PaymentShortSerializer(many=True)
+    current_amount = serializers.IntegerField(
+        source='live_current_amount', read_only=True
+    )
+    donators_count = serializers.IntegerField(
+        source='live_donators_count', read_only=True
+    )
+    payments = PaymentShortSerializer(
+        source='recent_payments', many=True, read_only=True
+    )
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Collect
@@ -132,8 +362,10 @@ class CollectSerializer(serializers.ModelSerializer):
             'finished_at',
             'author',
             'image',
+            'image_variants',
             'payments',
         )
+        expandable_fields = ('author', 'payments')
         read_only_fields = (
             'id',
             'current_amount',
@@ -142,11 +374,64 @@ class CollectSerializer(serializers.ModelSerializer):
             'is_finished',
             'author',
             'finished_at',
+            'image_variants',
             'payments',
         )
 
+    def get_image_variants(self, collect: Collect) -> dict[str, dict[str, str]]:
+        """URLs of resized images, empty until processing finishes."""
+        request = self.context.get('request')
+        return {
+            name: {
+                extension: (
+                    request.build_absolute_uri(default_storage.url(path))
+                    if request else default_storage.url(path)
+                )
+                for extension, path in formats.items()
+            }
+            for name, formats in collect.image_variants.items()
+        }
+
+
+class LeanCollectSerializer(LeanSerializer):
+    """Lean variant of CollectSerializer without image and payments.
+
+    Live totals need shard sums annotated by with_live_totals.
+    """
+
+    order = CollectSerializer.Meta.fields
+    fields = {
+        **{
+            name: lean_column(name)
+            for name in (
+                'id',
+                'title',
+                'reason',
+                'description',
+                'target_amount',
+                'is_finished',
+            )
+        },
+        'current_amount': LeanField(
+            ('current_amount', 'shard_amount'),
+            lambda row, prefix: (
+                row[f'{prefix}current_amount'] + row[f'{prefix}shard_amount']
+            ),
+        ),
+        'donators_count': LeanField(
+            ('donators_count', 'shard_donators_count'),
+            lambda row, prefix: (
+                row[f'{prefix}donators_count']
+                + row[f'{prefix}shard_donators_count']
+            ),
+        ),
+        'created_at': lean_datetime('created_at'),
+        'finished_at': lean_datetime('finished_at'),
+    }
+    relations = {'author': ('user', LeanUserSerializer)}
+
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Payment instances."""
 
     author = UserReadSerializer(source='user', read_only=True)
@@ -155,4 +440,80 @@ class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = ('id', 'amount', 'comment', 'author', 'collect')
+        expandable_fields = ('author', 'collect')
         read_only = fields
+
+
+class LeanPaymentSerializer(LeanSerializer):
+    """Lean variant of PaymentSerializer with collect as primary key."""
+
+    order = PaymentSerializer.Meta.fields
+    fields = {name: lean_column(name) for name in ('id', 'amount', 'comment')}
+    relations = {
+        'author': ('user', LeanUserSerializer),
+        'collect': ('collect', None),
+    }
+
+
+class StatsQuerySerializer(serializers.Serializer):
+    """Query parameters of statistics endpoints."""
+
+    by = serializers.ChoiceField(
+        choices=tuple(LEADERBOARD_KEYS), default='amount'
+    )
+    limit = serializers.IntegerField(
+        min_value=1, max_value=STATS_MAX_LIMIT, default=10
+    )
+    hours = serializers.IntegerField(
+        min_value=1, max_value=STATS_MAX_HOURS, default=24
+    )
+    collect = serializers.IntegerField(required=False)
+    reason = serializers.ChoiceField(
+        choices=ReasonChoices.choices, required=False
+    )
+
+
+class CollectFilterSerializer(serializers.Serializer):
+    """Query parameters of collects list filtering and search."""
+
+    reason = serializers.MultipleChoiceField(
+        choices=ReasonChoices.choices, required=False
+    )
+    is_finished = serializers.BooleanField(required=False)
+    target_amount__gte = serializers.IntegerField(min_value=0, required=False)
+    target_amount__lte = serializers.IntegerField(min_value=0, required=False)
+    current_amount__gte = serializers.IntegerField(
+        min_value=0, required=False
+    )
+    current_amount__lte = serializers.IntegerField(
+        min_value=0, required=False
+    )
+    created_at__gte = serializers.DateTimeField(required=False)
+    created_at__lte = serializers.DateTimeField(required=False)
+    search = serializers.CharField(
+        max_length=SEARCH_MAX_LENGTH,
+        required=False,
+        help_text='Full-text search in title and description',
+    )
+    title = serializers.CharField(
+        max_length=SEARCH_MAX_LENGTH,
+        required=False,
+        help_text='Typeahead by similar words of title',
+    )
+
+    @override
+    def validate(self, attrs: dict) -> dict:
+        for field in COLLECT_RANGE_FIELDS:
+            low = attrs.get(f'{field}__gte')
+            high = attrs.get(f'{field}__lte')
+            if low is not None and high is not None and low > high:
+                raise serializers.ValidationError(
+                    {f'{field}__lte': RANGE_MESSAGE.format(field=field)}
+                )
+        return attrs
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    """Query parameters of payments export."""
+
+    type = serializers.ChoiceField(choices=tuple(EXPORT_WRITERS), default='csv')
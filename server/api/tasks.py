@@ -1,8 +1,35 @@
+import json
+import logging
+from collections import defaultdict
+from collections.abc import Iterable
+from contextlib import suppress
+from datetime import UTC, datetime
+from functools import partial
+from smtplib import SMTPException
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection, send_mail
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils.module_loading import import_string
 
 from celery import shared_task
-from server.payment.models import Collect, Payment
+from redis.exceptions import LockError, RedisError
+from server.api.exports import delete_expired_exports, export_to_storage
+from server.api.images import build_image_variants
+from server.api.redis_utils import get_redis_client
+from server.payment.models import (
+    Collect,
+    CollectCounterShard,
+    CollectHourlyStats,
+    Payment,
+    ReasonHourlyStats,
+    donation_buckets,
+    write_donation_stats,
+)
+
+logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
@@ -12,6 +39,172 @@ COLLECT_MESSAGE = 'You created new collect!'
 PAYMENT_SUBJECT = 'New Payment Created!'
 PAYMENT_MESSAGE = 'You created payment with amount = {amount}!. Thank you!'
 
+DIGEST_SUBJECT = 'Your collects and payments: {count} updates'
+
+EMAIL_BUFFER_KEY = 'email-buffer'
+EMAIL_PROCESSING_KEY = 'email-buffer:processing'
+EMAIL_FLUSH_LOCK = 'email-buffer:flush-lock'
+EMAIL_FLUSH_LOCK_TIMEOUT = 300
+EMAIL_ATTEMPTS_KEY = 'email-buffer:attempts'
+EMAIL_DEAD_LETTER_KEY = 'email-buffer:dead'
+EMAIL_MAX_ATTEMPTS = 5
+
+# KEYS are buffer and processing lists, ARGV has batch size. Returns
+# unfinished batch left in processing list by failed run, or moves
+# next batch from buffer into processing list and returns it.
+CLAIM_EMAIL_BATCH_SCRIPT = """
+local entries = redis.call('LRANGE', KEYS[2], 0, -1)
+if #entries > 0 then
+    return entries
+end
+entries = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #entries > 0 then
+    redis.call('LTRIM', KEYS[1], #entries, -1)
+    redis.call('RPUSH', KEYS[2], unpack(entries))
+end
+return entries
+"""
+
+DONATION_STATS_KEY = 'donation-stats'
+DONATION_STATS_PROCESSING_KEY = 'donation-stats:processing'
+DONATION_STATS_FOLD_LOCK = 'donation-stats:fold-lock'
+DONATION_STATS_FOLD_LOCK_TIMEOUT = 300
+
+# KEYS are buffered and processing hashes. Returns hash left in
+# processing by failed run, or renames buffered hash into processing
+# and returns it.
+CLAIM_DONATION_STATS_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return {}
+    end
+    redis.call('RENAME', KEYS[1], KEYS[2])
+end
+return redis.call('HGETALL', KEYS[2])
+"""
+
+
+def queue_email(status: str, instance_pk: int, email: str) -> None:
+    """Put email into Redis buffer, or send it by task without Redis."""
+    redis_client = get_redis_client()
+    if redis_client is None:
+        send_email_task.delay(status, instance_pk, email)
+        return
+    redis_client.rpush(
+        EMAIL_BUFFER_KEY, json.dumps([status, instance_pk, email])
+    )
+
+
+def record_donation_stats(
+    donations: Iterable[tuple[int, str, int]], at: datetime
+) -> None:
+    """Add (collect_id, reason, amount) donations to hourly rollups.
+
+    With Redis increments are buffered after commit and folded into
+    hourly tables by beat, so donations do not wait on the shared
+    bucket rows. Without Redis rows are updated in the transaction.
+    """
+    by_collect, by_reason = donation_buckets(donations, at)
+    if get_redis_client() is None:
+        write_donation_stats(by_collect, by_reason)
+    else:
+        transaction.on_commit(
+            partial(queue_donation_stats, by_collect, by_reason)
+        )
+
+
+def queue_donation_stats(by_collect: dict, by_reason: dict) -> None:
+    """Add buckets to Redis hash, write them to database on error."""
+    pipeline = get_redis_client().pipeline(transaction=False)
+    for model, buckets in (
+        (CollectHourlyStats, by_collect), (ReasonHourlyStats, by_reason)
+    ):
+        for (key, hour), (amount, count) in buckets.items():
+            prefix = f'{model.bucket_field}:{key}:{int(hour.timestamp())}'
+            pipeline.hincrby(DONATION_STATS_KEY, f'{prefix}:amount', amount)
+            pipeline.hincrby(DONATION_STATS_KEY, f'{prefix}:count', count)
+    try:
+        pipeline.execute()
+    except RedisError:
+        logger.exception('Buffering of donation stats failed')
+        write_donation_stats(by_collect, by_reason)
+
+
+def parse_donation_stats(raw: dict) -> tuple[dict, dict]:
+    """Collect and reason buckets from fields of Redis hash."""
+    buckets = {
+        'collect': defaultdict(lambda: [0, 0]),
+        'reason': defaultdict(lambda: [0, 0]),
+    }
+    for field, value in raw.items():
+        bucket_field, rest = field.decode().split(':', 1)
+        key, timestamp, metric = rest.rsplit(':', 2)
+        if bucket_field == 'collect':
+            key = int(key)
+        hour = datetime.fromtimestamp(int(timestamp), UTC)
+        buckets[bucket_field][key, hour][metric == 'count'] += int(value)
+    return buckets['collect'], buckets['reason']
+
+
+def send_buffered_emails(
+    entries: list[tuple[str, int, str]],
+) -> tuple[int, list[tuple[str, int, str]]]:
+    """Send deduplicated entries with one message per recipient.
+
+    Returns count of sent messages and entries of recipients whose
+    message failed, other recipients are not held back by them.
+    """
+    by_recipient = defaultdict(list)
+    for status, instance_pk, email in dict.fromkeys(map(tuple, entries)):
+        by_recipient[email].append((status, instance_pk))
+    collects = Collect.objects.only('title').in_bulk([
+        pk for status, pk, _ in entries if status == 'collect'
+    ])
+    payments = Payment.objects.only('amount').in_bulk([
+        pk for status, pk, _ in entries if status == 'payment'
+    ])
+    sent = 0
+    failed = []
+    with get_connection() as connection:
+        for email, items in by_recipient.items():
+            lines = []
+            for status, instance_pk in items:
+                if status == 'collect' and instance_pk in collects:
+                    lines.append((
+                        COLLECT_SUBJECT.format(
+                            title=collects[instance_pk].title
+                        ),
+                        COLLECT_MESSAGE,
+                    ))
+                elif status == 'payment' and instance_pk in payments:
+                    lines.append((
+                        PAYMENT_SUBJECT,
+                        PAYMENT_MESSAGE.format(
+                            amount=payments[instance_pk].amount
+                        ),
+                    ))
+            if not lines:
+                continue
+            if len(lines) == 1:
+                subject, message = lines[0]
+            else:
+                subject = DIGEST_SUBJECT.format(count=len(lines))
+                message = '\n\n'.join(
+                    f'{line_subject}\n{line_message}'
+                    for line_subject, line_message in lines
+                )
+            try:
+                sent += connection.send_messages(
+                    [EmailMessage(subject, message, None, [email])]
+                )
+            except (SMTPException, OSError):
+                logger.exception('Sending buffered email failed')
+                failed.extend(
+                    (status, instance_pk, email)
+                    for status, instance_pk in items
+                )
+    return sent, failed
+
 
 @shared_task
 def send_email_task(status: str, instance_pk: int, email: str) -> None:
@@ -30,3 +223,169 @@ def send_email_task(status: str, instance_pk: int, email: str) -> None:
         recipient_list=[email],
         from_email=None,
     )
+
+
+@shared_task
+def process_collect_image_task(collect_pk: int) -> None:
+    """Build resized variants of collect image outside request cycle."""
+    from server.api.cache_utils import invalidate
+
+    collect = Collect.objects.filter(pk=collect_pk).only('pk', 'image').first()
+    if collect is None:
+        return
+    if not collect.image:
+        Collect.objects.filter(pk=collect_pk).update(image_variants={})
+    else:
+        Collect.objects.filter(
+            pk=collect_pk, image=collect.image.name
+        ).update(image_variants=build_image_variants(collect))
+    invalidate('collect')
+
+
+@shared_task
+def export_collect_payments_task(
+    collect_pk: int, export_type: str, name: str
+) -> str:
+    """Write gzipped payments export of collect to private storage."""
+    return export_to_storage(collect_pk, export_type, name)
+
+
+@shared_task
+def delete_expired_exports_task() -> int:
+    """Delete exports older than PAYMENT_EXPORT_TTL, return their count."""
+    return delete_expired_exports()
+
+
+@shared_task
+def rollup_counter_shards_task() -> int:
+    """Fold counter shards into collect totals, return count of collects."""
+    collect_ids = set(
+        CollectCounterShard.objects.exclude(
+            amount=0, donators_count=0
+        ).values_list('collect_id', flat=True)
+    )
+    for collect_id in collect_ids:
+        Collect.objects.rollup_counter_shards(collect_id)
+    return len(collect_ids)
+
+
+@shared_task
+def fold_donation_stats_task() -> int:
+    """Add donation stats buffered in Redis to hourly tables.
+
+    Returns count of folded buckets. Stats of deleted collects are
+    dropped, hash stays in processing until the rows are committed.
+    """
+    redis_client = get_redis_client()
+    if redis_client is None:
+        return 0
+    lock = redis_client.lock(
+        DONATION_STATS_FOLD_LOCK, timeout=DONATION_STATS_FOLD_LOCK_TIMEOUT
+    )
+    if not lock.acquire(blocking=False):
+        return 0
+    try:
+        raw = redis_client.register_script(CLAIM_DONATION_STATS_SCRIPT)(
+            keys=[DONATION_STATS_KEY, DONATION_STATS_PROCESSING_KEY]
+        )
+        if not raw:
+            return 0
+        by_collect, by_reason = parse_donation_stats(
+            dict(zip(raw[::2], raw[1::2]))
+        )
+        existing = set(Collect.objects.filter(
+            pk__in={pk for pk, _ in by_collect}
+        ).values_list('pk', flat=True))
+        by_collect = {
+            bucket: totals for bucket, totals in by_collect.items()
+            if bucket[0] in existing
+        }
+        with transaction.atomic():
+            write_donation_stats(by_collect, by_reason)
+        redis_client.delete(DONATION_STATS_PROCESSING_KEY)
+        return len(by_collect) + len(by_reason)
+    finally:
+        with suppress(LockError):
+            lock.release()
+
+
+@shared_task
+def refresh_cache_task(
+    view_path: str,
+    basename: str,
+    action: str,
+    path: str,
+    query_string: str,
+    host: str,
+    secure: bool,
+    accept: str,
+    kwargs: dict,
+) -> None:
+    """Recompute cached GET response of viewset in background."""
+    request = RequestFactory().get(
+        path,
+        QUERY_STRING=query_string,
+        HTTP_HOST=host,
+        HTTP_ACCEPT=accept or '*/*',
+        secure=secure,
+    )
+    request.cache_refresh = True
+    view = import_string(view_path).as_view(
+        {'get': action}, basename=basename, detail=action == 'retrieve'
+    )
+    view(request, **kwargs)
+
+
+def keep_failed_emails(redis_client, failed: list) -> None:
+    """Leave failed entries for next run or move them to dead letters."""
+    raw_entries = [json.dumps(list(entry)) for entry in failed]
+    pipeline = redis_client.pipeline()
+    pipeline.delete(EMAIL_PROCESSING_KEY)
+    if redis_client.incr(EMAIL_ATTEMPTS_KEY) >= EMAIL_MAX_ATTEMPTS:
+        pipeline.rpush(EMAIL_DEAD_LETTER_KEY, *raw_entries)
+        pipeline.delete(EMAIL_ATTEMPTS_KEY)
+    else:
+        pipeline.rpush(EMAIL_PROCESSING_KEY, *raw_entries)
+    pipeline.execute()
+
+
+@shared_task
+def flush_email_buffer_task() -> int:
+    """Send emails collected in Redis buffer, return count of messages.
+
+    Batch stays in processing list until it is sent, so entries of
+    failed run are sent by the next one instead of being lost. Only
+    entries of failed recipients are retried, after EMAIL_MAX_ATTEMPTS
+    runs they are moved to dead letter list. Lock keeps overlapping
+    runs from sending the same batch.
+    """
+    redis_client = get_redis_client()
+    if redis_client is None:
+        return 0
+    lock = redis_client.lock(
+        EMAIL_FLUSH_LOCK, timeout=EMAIL_FLUSH_LOCK_TIMEOUT
+    )
+    if not lock.acquire(blocking=False):
+        return 0
+    claim_batch = redis_client.register_script(CLAIM_EMAIL_BATCH_SCRIPT)
+    sent = 0
+    try:
+        while True:
+            raw_entries = claim_batch(
+                keys=[EMAIL_BUFFER_KEY, EMAIL_PROCESSING_KEY],
+                args=[settings.EMAIL_BUFFER_BATCH_SIZE],
+            )
+            if not raw_entries:
+                return sent
+            batch_sent, failed = send_buffered_emails(
+                [json.loads(entry) for entry in raw_entries]
+            )
+            sent += batch_sent
+            if failed:
+                keep_failed_emails(redis_client, failed)
+                return sent
+            redis_client.delete(EMAIL_PROCESSING_KEY, EMAIL_ATTEMPTS_KEY)
+            lock.reacquire()
+    finally:
+        with suppress(LockError):
+            lock.release()
@@ -0,0 +1,129 @@
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from server.api.redis_utils import get_redis_client
+
+THROTTLE_KEY = 'throttle:{scope}:{ident}'
+RATE_PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# KEYS are buckets, ARGV has capacity, refill per second and cost of
+# each. Tokens are taken only when every bucket has enough, so a
+# rejected request does not drain the other buckets. Returns allowed
+# flag and milliseconds until the emptiest bucket refills.
+TOKEN_BUCKET_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local buckets = {}
+local wait = 0
+for index, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[index * 3 - 2])
+    local rate = tonumber(ARGV[index * 3 - 1]) / 1000
+    local cost = tonumber(ARGV[index * 3])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    if tokens < cost then
+        wait = math.max(wait, math.ceil((cost - tokens) / rate))
+    end
+    buckets[index] = {tokens, cost, math.ceil(capacity / rate)}
+end
+local allowed = wait == 0 and 1 or 0
+for index, key in ipairs(KEYS) do
+    local tokens = buckets[index][1] - buckets[index][2] * allowed
+    redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', now)
+    redis.call('PEXPIRE', key, buckets[index][3])
+end
+return {allowed, wait}
+"""
+
+
+def parse_rate(rate: str) -> tuple[int, float]:
+    """Capacity and refill per second of rate like '30/min'."""
+    count, period = rate.split('/')
+    count = int(count)
+    return count, count / RATE_PERIODS[period[0]]
+
+
+def take_tokens(
+    buckets: list[tuple[str, str, int]],
+) -> tuple[bool, float]:
+    """Take cost tokens of every (key, rate, cost) bucket in one round trip.
+
+    Cost above capacity waits for a full bucket instead of never
+    passing. Returns allowed flag and seconds to wait. Without Redis
+    requests are not throttled.
+    """
+    redis_client = get_redis_client()
+    if redis_client is None or not buckets:
+        return True, 0.0
+    args = []
+    for _, rate, cost in buckets:
+        capacity, refill = parse_rate(rate)
+        args.extend((capacity, refill, min(cost, capacity)))
+    allowed, wait = redis_client.register_script(TOKEN_BUCKET_SCRIPT)(
+        keys=[key for key, *_ in buckets], args=args
+    )
+    return bool(allowed), wait / 1000
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle with token buckets in Redis checked by one script call.
+
+    Buckets refill continuously, so bursts up to the rate are allowed
+    without fixed window edges.
+    """
+
+    wait_seconds = None
+
+    def get_buckets(self, request, view) -> list[tuple[str, str, int]]:
+        """(key, rate, cost) of buckets request takes tokens from."""
+        raise NotImplementedError
+
+    def allow_request(self, request, view) -> bool:
+        allowed, wait = take_tokens(self.get_buckets(request, view))
+        self.wait_seconds = None if allowed else wait
+        return allowed
+
+    def wait(self) -> float | None:
+        return self.wait_seconds
+
+
+class PaymentThrottle(TokenBucketThrottle):
+    """Payment creation rate per user and per collect.
+
+    Bulk requests also take a token per row from user bucket of bulk
+    rows, so rows do not bypass the rate by sharing one request.
+    """
+
+    def get_buckets(self, request, view) -> list[tuple[str, str, int]]:
+        if request.method != 'POST':
+            return []
+        rates = settings.PAYMENT_THROTTLE_RATES
+        buckets = [(
+            THROTTLE_KEY.format(scope='payment-user', ident=request.user.pk),
+            rates['user'],
+            1,
+        )]
+        if view.action == 'bulk':
+            buckets.append((
+                THROTTLE_KEY.format(
+                    scope='payment-bulk-rows', ident=request.user.pk
+                ),
+                rates['bulk_rows'],
+                len(request.data) if isinstance(request.data, list) else 1,
+            ))
+        collect_id = (
+            request.data.get('collect_id')
+            if view.action == 'create' and isinstance(request.data, dict)
+            else None
+        )
+        if isinstance(collect_id, int | str) and str(collect_id).isdigit():
+            buckets.append((
+                THROTTLE_KEY.format(
+                    scope='payment-collect', ident=int(collect_id)
+                ),
+                rates['collect'],
+                1,
+            ))
+        return buckets
@@ -1,6 +1,13 @@
+from django.conf import settings
 from rest_framework.routers import DefaultRouter
 
-from server.api.views import CollectViewSet, PaymentViewSet, UserViewset
+from server.api.async_views import async_read_urls
+from server.api.views import (
+    CollectViewSet,
+    PaymentViewSet,
+    StatsViewSet,
+    UserViewset,
+)
 
 router = DefaultRouter()
 router.register(
@@ -18,3 +25,12 @@ router.register(
     CollectViewSet,
     basename='collect',
 )
+router.register(
+    'stats',
+    StatsViewSet,
+    basename='stats',
+)
+
+urlpatterns = router.urls
+if settings.API_ASYNC_READS:
+    urlpatterns = async_read_urls(urlpatterns)
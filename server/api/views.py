@@ -1,26 +1,198 @@
+import uuid
+from datetime import timedelta
+from functools import partial
 from typing import override
 
-from drf_spectacular.utils import extend_schema
-from rest_framework import mixins, permissions, viewsets
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch, QuerySet, Sum
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import (
+    OpenApiParameter,
+    extend_schema,
+    extend_schema_view,
+)
+from rest_framework import mixins, permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
 from rest_framework.serializers import ModelSerializer
+from rest_framework.views import APIView
 
-from server.api.cache_utils import CachedViewSetMixin
-from server.api.permissions import AuthorOrReadOnly
+from server.api.authentication import token_author
+from server.api.cache_utils import (
+    CacheInvalidationMixin,
+    CachedViewSetMixin,
+    cache_stats,
+)
+from server.api.exports import (
+    EXPORT_CONTENT_TYPES,
+    export_name,
+    export_response,
+    export_stream,
+)
+from server.api.fieldsets import (
+    EXPAND_PARAM,
+    FIELDS_PARAM,
+    FieldSelection,
+    SparseFieldsetViewMixin,
+)
+from server.api.filters import CollectFilterBackend
+from server.api.idempotency import IDEMPOTENCY_HEADER, idempotent
+from server.api.instrumentation import InstrumentedViewMixin
+from server.api.leaderboard import (
+    remove_from_leaderboards,
+    top_collects,
+    update_leaderboards,
+)
+from server.api.pagination import (
+    CollectPaymentsPagination,
+    SwitchablePagination,
+)
+from server.api.parsers import NDJSONParser
+from server.api.permissions import AuthorOnly, AuthorOrReadOnly
+from server.api.redis_utils import on_commit_redis
 from server.api.serializers import (
+    CollectFilterSerializer,
+    CollectPaymentSerializer,
     CollectSerializer,
+    ExportQuerySerializer,
+    LeanCollectSerializer,
+    LeanPaymentSerializer,
     PaymentCreateSerializer,
     PaymentSerializer,
+    StatsQuerySerializer,
     UserCreateSerializer,
     UserReadSerializer,
 )
-from server.api.tasks import send_email_task
-from server.payment.models import Collect, Payment, User
+from server.api.tasks import (
+    export_collect_payments_task,
+    process_collect_image_task,
+    queue_email,
+)
+from server.api.throttling import PaymentThrottle
+from server.payment.models import (
+    RECENT_PAYMENTS_ORDERING,
+    Collect,
+    CollectHourlyStats,
+    Payment,
+    ReasonHourlyStats,
+    User,
+)
+from server.src.db_pool import connection_pool_stats
+
+READ_ACTIONS = ('list', 'retrieve')
+LIVE_TOTAL_FIELDS = ('current_amount', 'donators_count')
+AUTHOR_COLUMNS = {'username': ('username',), 'email': ('email',)}
+COLLECT_COLUMNS = {
+    'id': ('id',),
+    'title': ('title',),
+    'reason': ('reason',),
+    'description': ('description',),
+    'target_amount': ('target_amount',),
+    'current_amount': ('current_amount', 'is_sharded'),
+    'donators_count': ('donators_count', 'is_sharded'),
+    'created_at': ('created_at',),
+    'is_finished': ('is_finished',),
+    'finished_at': ('finished_at',),
+    'author': ('user',),
+    'image': ('image',),
+    'image_variants': ('image_variants',),
+    'payments': (),
+}
+PAYMENT_COLUMNS = {
+    'id': ('id',),
+    'amount': ('amount',),
+    'comment': ('comment',),
+    'author': ('user',),
+    'collect': ('collect',),
+}
+SHORT_PAYMENT_COLUMNS = {'id': ('id',), 'amount': ('amount',)}
+FIELDSET_PARAMETERS = [
+    OpenApiParameter(
+        FIELDS_PARAM,
+        description='Comma separated fields, nested as author.email',
+    ),
+    OpenApiParameter(
+        EXPAND_PARAM,
+        description=(
+            'Comma separated relations rendered as objects, others are '
+            'primary keys. All relations are expanded without it.'
+        ),
+    ),
+]
+IDEMPOTENCY_PARAMETER = OpenApiParameter(
+    IDEMPOTENCY_HEADER,
+    location=OpenApiParameter.HEADER,
+    description='Retries with the same key replay the first response.',
+)
+EXPORT_QUEUED_SCHEMA = {
+    'type': 'object',
+    'properties': {'file': {'type': 'string', 'format': 'uri'}},
+}
+BULK_RESULT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'created': {'type': 'integer'},
+        'rejected': {'type': 'integer'},
+        'results': {'type': 'array', 'items': {'type': 'object'}},
+    },
+}
+
+
+def recent_payments_prefetch(
+    lookup: str, selection: FieldSelection
+) -> Prefetch:
+    """Prefetch bounded window of payments for PaymentShortSerializer."""
+    return Prefetch(
+        lookup,
+        queryset=Payment.objects.only(
+            'id', 'collect', *selection.columns(SHORT_PAYMENT_COLUMNS)
+        ).order_by(
+            *RECENT_PAYMENTS_ORDERING
+        )[:settings.COLLECT_RECENT_PAYMENTS],
+        to_attr='prefetched_recent_payments',
+    )
+
+
+def collect_columns(selection: FieldSelection, prefix: str = '') -> list[str]:
+    """Columns of selected collect fields and its expanded author."""
+    columns = [f'{prefix}id', *selection.columns(COLLECT_COLUMNS, prefix)]
+    if selection.expands('author'):
+        columns.extend(selection.child('author').columns(
+            AUTHOR_COLUMNS, f'{prefix}user__'
+        ))
+    return columns
 
 
 @extend_schema(tags=['Users'])
-class UserViewset(viewsets.ModelViewSet):
+@extend_schema_view(
+    list=extend_schema(parameters=FIELDSET_PARAMETERS),
+    retrieve=extend_schema(parameters=FIELDSET_PARAMETERS),
+)
+class UserViewset(
+    InstrumentedViewMixin,
+    CacheInvalidationMixin,
+    SparseFieldsetViewMixin,
+    viewsets.ModelViewSet,
+):
     queryset = User.objects.all()
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    basename = 'user'
+
+    @override
+    def get_queryset(self) -> QuerySet[User]:
+        """Load only columns of requested fields."""
+        queryset = super().get_queryset()
+        if self.action not in READ_ACTIONS:
+            return queryset
+        return queryset.only(
+            'id', *self.field_selection.columns(AUTHOR_COLUMNS)
+        )
 
     @override
     def get_serializer_class(self) -> ModelSerializer:
@@ -29,10 +201,21 @@ class UserViewset(viewsets.ModelViewSet):
             return UserCreateSerializer
         return UserReadSerializer
 
+    @override
+    def perform_create(self, serializer: UserCreateSerializer) -> None:
+        """New user is not embedded anywhere, so caches stay valid."""
+        serializer.save()
+
 
 @extend_schema(tags=['Payments'])
+@extend_schema_view(
+    list=extend_schema(parameters=FIELDSET_PARAMETERS),
+    retrieve=extend_schema(parameters=FIELDSET_PARAMETERS),
+)
 class PaymentViewSet(
+    InstrumentedViewMixin,
     CachedViewSetMixin,
+    SparseFieldsetViewMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
@@ -43,36 +226,380 @@ class PaymentViewSet(
     queryset = Payment.objects.all()
     basename = 'payment'
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    throttle_classes = (PaymentThrottle,)
+    pagination_class = SwitchablePagination
+    lean_serializer_class = LeanPaymentSerializer
+
+    @override
+    def get_queryset(self) -> QuerySet[Payment]:
+        """Load requested fields of PaymentSerializer in constant queries.
+
+        Only columns of requested fields are loaded and only expanded
+        relations are joined or prefetched.
+        """
+        queryset = super().get_queryset()
+        if self.action not in READ_ACTIONS:
+            return queryset
+        selection = self.field_selection
+        columns = ['id', 'created_at', *selection.columns(PAYMENT_COLUMNS)]
+        if selection.expands('author'):
+            queryset = queryset.select_related('user')
+            columns.extend(selection.child('author').columns(
+                AUTHOR_COLUMNS, 'user__'
+            ))
+        if selection.expands('collect'):
+            collect = selection.child('collect')
+            queryset = queryset.select_related('collect')
+            columns.extend(collect_columns(collect, 'collect__'))
+            if collect.expands('author'):
+                queryset = queryset.select_related('collect__user')
+            if collect.includes('payments'):
+                queryset = queryset.prefetch_related(recent_payments_prefetch(
+                    'collect__payments', collect.child('payments')
+                ))
+            if any(map(collect.includes, LIVE_TOTAL_FIELDS)):
+                queryset = queryset.prefetch_related('collect__counter_shards')
+        return queryset.only(*columns)
 
     @override
     def get_serializer_class(
         self,
     ) -> PaymentCreateSerializer | PaymentSerializer:
-        if self.action == 'create':
+        if self.action in ('create', 'bulk'):
             return PaymentCreateSerializer
         return PaymentSerializer
 
+    @extend_schema(parameters=[IDEMPOTENCY_PARAMETER])
+    @override
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        """Create payment, retries with Idempotency-Key are replayed."""
+        return super().create(request, *args, **kwargs)
+
     @override
     def perform_create(self, serializer: PaymentCreateSerializer) -> None:
         """Adding currect user during creating of new Payment."""
-        payment = serializer.save(user=self.request.user)
+        payment = serializer.save(user=token_author(self.request.user))
         self._clear_cache_for('payment', payment.pk)
-        self._clear_cache_for('collect', payment.collect.pk)
-        send_email_task.delay('payment', payment.pk, self.request.user.email)
+        on_commit_redis(
+            queue_email, 'payment', payment.pk, self.request.user.email
+        )
+
+    @extend_schema(
+        request=PaymentCreateSerializer(many=True),
+        parameters=[IDEMPOTENCY_PARAMETER],
+        responses={
+            status.HTTP_201_CREATED: BULK_RESULT_SCHEMA,
+            status.HTTP_207_MULTI_STATUS: BULK_RESULT_SCHEMA,
+        },
+    )
+    @action(
+        detail=False,
+        methods=('post',),
+        parser_classes=(JSONParser, NDJSONParser),
+    )
+    @idempotent
+    def bulk(self, request):
+        """Create many payments from JSON list or NDJSON at once.
+
+        Rejected rows do not stop the import: response has result of
+        every row and status 207 when some rows were rejected.
+        """
+        serializer = self.get_serializer(
+            data=request.data,
+            many=True,
+            max_length=settings.PAYMENT_BULK_MAX_ROWS,
+        )
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save(user=token_author(request.user))
+        created = sum(result['status'] == 'created' for result in results)
+        if created:
+            self._clear_cache_for('payment')
+        return Response(
+            {
+                'created': created,
+                'rejected': len(results) - created,
+                'results': results,
+            },
+            status=(
+                status.HTTP_201_CREATED if created == len(results)
+                else status.HTTP_207_MULTI_STATUS
+            ),
+        )
 
 
 @extend_schema(tags=['Collects'])
-class CollectViewSet(CachedViewSetMixin, viewsets.ModelViewSet):
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[CollectFilterSerializer, *FIELDSET_PARAMETERS]
+    ),
+    retrieve=extend_schema(parameters=FIELDSET_PARAMETERS),
+)
+class CollectViewSet(
+    InstrumentedViewMixin,
+    CachedViewSetMixin,
+    SparseFieldsetViewMixin,
+    viewsets.ModelViewSet,
+):
     """ViewSet for Collect model with caching utils."""
 
     queryset = Collect.objects.all()
     serializer_class = CollectSerializer
     permission_classes = (AuthorOrReadOnly,)
+    filter_backends = (CollectFilterBackend,)
+    pagination_class = SwitchablePagination
+    lean_serializer_class = LeanCollectSerializer
     basename = 'collect'
 
+    @override
+    def get_queryset(self) -> QuerySet[Collect]:
+        """Load requested fields of CollectSerializer in constant queries.
+
+        Shard totals are annotated only for requested live totals,
+        author is joined and payments prefetched only when requested.
+        """
+        queryset = super().get_queryset()
+        if self.action not in READ_ACTIONS:
+            return queryset.with_live_totals()
+        selection = self.field_selection
+        if any(map(selection.includes, LIVE_TOTAL_FIELDS)):
+            queryset = queryset.with_live_totals()
+        if selection.expands('author'):
+            queryset = queryset.select_related('user')
+        if selection.includes('payments'):
+            queryset = queryset.prefetch_related(recent_payments_prefetch(
+                'payments', selection.child('payments')
+            ))
+        return queryset.only(*collect_columns(selection), 'created_at')
+
     @override
     def perform_create(self, serializer: CollectSerializer) -> None:
         """Adding currect user during creating of new Collect."""
-        collect = serializer.save(user=self.request.user)
+        collect = self._save_with_image(
+            serializer, user=token_author(self.request.user)
+        )
+        self._clear_cache_for('collect', collect.pk)
+        on_commit_redis(update_leaderboards, ((
+            collect.pk, collect.current_amount, collect.target_amount
+        ),))
+        on_commit_redis(
+            queue_email, 'collect', collect.pk, self.request.user.email
+        )
+
+    @override
+    def perform_update(self, serializer: CollectSerializer) -> None:
+        """Clear cache and reprocess image if it was replaced."""
+        collect = self._save_with_image(serializer)
         self._clear_cache_for('collect', collect.pk)
-        send_email_task.delay('collect', collect.pk, self.request.user.email)
+        on_commit_redis(update_leaderboards, ((
+            collect.pk, collect.live_current_amount, collect.target_amount
+        ),))
+
+    @override
+    def perform_destroy(self, instance: Collect) -> None:
+        """Clear cache and drop collect from leaderboards."""
+        pk = instance.pk
+        super().perform_destroy(instance)
+        on_commit_redis(remove_from_leaderboards, pk)
+
+    @staticmethod
+    def _save_with_image(serializer: CollectSerializer, **kwargs) -> Collect:
+        """Save collect and queue resizing of new image after commit."""
+        if 'image' not in serializer.validated_data:
+            return serializer.save(**kwargs)
+        collect = serializer.save(image_variants={}, **kwargs)
+        transaction.on_commit(partial(
+            process_collect_image_task.delay, collect.pk
+        ))
+        return collect
+
+    @extend_schema(
+        methods=('get',),
+        parameters=[ExportQuerySerializer],
+        responses={
+            (status.HTTP_200_OK, content_type.split(';')[0]): OpenApiTypes.STR
+            for content_type in EXPORT_CONTENT_TYPES.values()
+        },
+    )
+    @extend_schema(
+        methods=('post',),
+        request=None,
+        parameters=[ExportQuerySerializer],
+        responses={status.HTTP_202_ACCEPTED: EXPORT_QUEUED_SCHEMA},
+    )
+    @action(
+        detail=True,
+        methods=('get', 'post'),
+        permission_classes=(AuthorOnly,),
+    )
+    def export(self, request, pk=None):
+        """All payments of collect for its author as CSV or NDJSON.
+
+        GET streams rows read from server-side cursor in chunks. POST
+        queues gzipped export to private storage for big collects and
+        returns URL of export_file which serves it once it is written.
+        """
+        collect = get_object_or_404(Collect.objects.only('id', 'user'), pk=pk)
+        self.check_object_permissions(request, collect)
+        query = ExportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        export_type = query.validated_data['type']
+        if request.method == 'POST':
+            token = uuid.uuid4().hex
+            export_collect_payments_task.delay(
+                collect.pk, export_type, export_name(collect.pk, export_type, token)
+            )
+            return Response(
+                {'file': request.build_absolute_uri(reverse(
+                    'collect-export-file',
+                    kwargs={
+                        'pk': collect.pk,
+                        'token': token,
+                        'export_type': export_type,
+                    },
+                ))},
+                status=status.HTTP_202_ACCEPTED,
+            )
+        response = StreamingHttpResponse(
+            export_stream(collect.pk, export_type),
+            content_type=EXPORT_CONTENT_TYPES[export_type],
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="collect-{collect.pk}-payments.'
+            f'{export_type}"'
+        )
+        return response
+
+    @extend_schema(
+        responses={(status.HTTP_200_OK, 'application/gzip'): OpenApiTypes.BINARY}
+    )
+    @action(
+        detail=True,
+        methods=('get',),
+        permission_classes=(AuthorOnly,),
+        url_path=(
+            r'export/(?P<token>[0-9a-f]{32})\.(?P<export_type>csv|ndjson)\.gz'
+        ),
+        url_name='export-file',
+    )
+    def export_file(self, request, pk=None, token=None, export_type=None):
+        """Gzipped export queued by POST, for author of collect only.
+
+        Returns 404 until the file is written and after it expires.
+        """
+        collect = get_object_or_404(Collect.objects.only('id', 'user'), pk=pk)
+        self.check_object_permissions(request, collect)
+        return export_response(
+            export_name(collect.pk, export_type, token),
+            f'collect-{collect.pk}-payments.{export_type}.gz',
+        )
+
+    @extend_schema(responses=CollectPaymentSerializer(many=True))
+    @action(
+        detail=True,
+        methods=('get',),
+        serializer_class=CollectPaymentSerializer,
+        pagination_class=CollectPaymentsPagination,
+    )
+    def payments(self, request, pk=None):
+        """Keyset paginated payments of one collect."""
+        collect = get_object_or_404(Collect.objects.only('id'), pk=pk)
+        page = self.paginate_queryset(
+            collect.payments.only(*CollectPaymentSerializer.Meta.fields)
+        )
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+@extend_schema(tags=['Service'])
+class CacheStatsView(APIView):
+    """Hit and miss counters of cache tiers in this worker."""
+
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return Response(cache_stats())
+
+
+@extend_schema(tags=['Service'])
+class ConnectionPoolStatsView(APIView):
+    """Counters of database connection pools in this worker."""
+
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return Response(connection_pool_stats())
+
+
+@extend_schema(tags=['Statistics'], parameters=[StatsQuerySerializer])
+class StatsViewSet(viewsets.ViewSet):
+    """Read-only statistics from hourly rollups and leaderboards."""
+
+    @action(detail=False, methods=('get',))
+    def leaderboard(self, request):
+        """Top collects by current amount or by completion ratio."""
+        params = self._params(request)
+        top = top_collects(params['by'], params['limit'])
+        collects = Collect.objects.only(
+            'id', 'title', 'target_amount'
+        ).in_bulk([pk for pk, _ in top])
+        return Response([
+            {
+                'id': pk,
+                'title': collects[pk].title,
+                'target_amount': collects[pk].target_amount,
+                'score': score,
+            }
+            for pk, score in top
+            if pk in collects
+        ])
+
+    @action(detail=False, methods=('get',))
+    def reasons(self, request):
+        """Totals by reason for the last hours."""
+        params = self._params(request)
+        return Response(
+            ReasonHourlyStats.objects.filter(
+                hour__gte=self._since(params['hours'])
+            ).values('reason').annotate(
+                amount=Sum('amount'),
+                donations_count=Sum('donations_count'),
+            ).order_by('reason')
+        )
+
+    @action(detail=False, methods=('get',))
+    def hourly(self, request):
+        """Hourly buckets of one collect, one reason or all reasons."""
+        params = self._params(request)
+        since = self._since(params['hours'])
+        if 'collect' in params:
+            queryset = CollectHourlyStats.objects.filter(
+                collect_id=params['collect'], hour__gte=since
+            )
+        else:
+            queryset = ReasonHourlyStats.objects.filter(hour__gte=since)
+            if 'reason' in params:
+                queryset = queryset.filter(reason=params['reason'])
+            queryset = queryset.values('hour').annotate(
+                amount=Sum('amount'),
+                donations_count=Sum('donations_count'),
+            )
+        return Response(
+            queryset.values('hour', 'amount', 'donations_count').order_by(
+                'hour'
+            )
+        )
+
+    @staticmethod
+    def _params(request) -> dict:
+        """Validated query parameters."""
+        serializer = StatsQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    @staticmethod
+    def _since(hours: int):
+        """Start of the first hourly bucket in window."""
+        return timezone.now().replace(
+            minute=0, second=0, microsecond=0
+        ) - timedelta(hours=hours - 1)
@@ -1,9 +1,24 @@
 import os
 
 from celery import Celery
+from celery.signals import worker_init, worker_process_init
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.src.settings')
 
 app = Celery('server')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
+
+
+@worker_init.connect
+def close_pools_before_fork(**kwargs):
+    """Prefork children must not inherit connection pool of parent."""
+    from server.src.db_pool import close_connection_pools
+    close_connection_pools()
+
+
+@worker_process_init.connect
+def forget_inherited_pools(**kwargs):
+    """Child process opens its own connection pool on first query."""
+    from server.src.db_pool import forget_connection_pools
+    forget_connection_pools()
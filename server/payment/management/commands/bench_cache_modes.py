@@ -0,0 +1,73 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIClient
+
+from server.api.cache_utils import invalidate
+from server.api.views import CollectViewSet, PaymentViewSet
+
+VIEWSETS = (CollectViewSet, PaymentViewSet)
+
+
+class Command(BaseCommand):
+    """Latency benchmark of cached data and rendered bytes modes."""
+
+    help = 'Compare p50/p99 latency of cache hits in both cache modes.'
+
+    def add_arguments(self, parser):
+        """Method for adding optional args."""
+        parser.add_argument(
+            '--requests', type=int, default=500,
+            help='Count of requests for every mode',
+        )
+        parser.add_argument(
+            '--url', type=str, default='/api/payments/',
+            help='Cached endpoint for the benchmark',
+        )
+        parser.add_argument(
+            '--host', type=str, default='localhost',
+            help='Host header allowed by ALLOWED_HOSTS',
+        )
+
+    def handle(self, *args, **options):
+        """Main logic of bench_cache_modes command."""
+        client = APIClient(HTTP_HOST=options['host'])
+        url = options['url']
+        modes = {viewset: viewset.cache_rendered for viewset in VIEWSETS}
+        try:
+            for rendered in (False, True):
+                for viewset in VIEWSETS:
+                    viewset.cache_rendered = rendered
+                invalidate('collect')
+                etag = client.get(url).get('ETag')
+                self.report(
+                    'rendered' if rendered else 'data',
+                    self.measure(client, url, options['requests']),
+                )
+                if etag:
+                    self.report('rendered+if-none-match', self.measure(
+                        client, url, options['requests'],
+                        HTTP_IF_NONE_MATCH=etag,
+                    ))
+        finally:
+            for viewset, rendered in modes.items():
+                viewset.cache_rendered = rendered
+
+    @staticmethod
+    def measure(client, url: str, requests: int, **headers) -> list[float]:
+        """Latencies of cache hits in milliseconds."""
+        latencies = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            client.get(url, **headers)
+            latencies.append((time.perf_counter() - started) * 1000)
+        return latencies
+
+    def report(self, mode: str, latencies: list[float]) -> None:
+        """Print p50 and p99 latency."""
+        percentiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f'mode={mode} p50={percentiles[49]:.2f}ms '
+            f'p99={percentiles[98]:.2f}ms'
+        )
@@ -0,0 +1,79 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.test import APIClient
+
+from server.api.cache_utils import invalidate
+from server.api.views import CollectViewSet
+
+
+class Command(BaseCommand):
+    """Load benchmark of cache expiry on the collect list endpoint."""
+
+    help = 'Count DB queries per cache expiry with concurrent workers.'
+
+    def add_arguments(self, parser):
+        """Method for adding optional args."""
+        parser.add_argument(
+            '--workers', type=int, default=16,
+            help='Count of concurrent workers',
+        )
+        parser.add_argument(
+            '--events', type=int, default=5,
+            help='Count of expiry events for every mode',
+        )
+        parser.add_argument(
+            '--url', type=str, default='/api/collects/',
+            help='Cached endpoint for the benchmark',
+        )
+        parser.add_argument(
+            '--host', type=str, default='localhost',
+            help='Host header allowed by ALLOWED_HOSTS',
+        )
+
+    def handle(self, *args, **options):
+        """Main logic of bench_cache_stampede command."""
+        self.lock = threading.Lock()
+        self.client = APIClient(HTTP_HOST=options['host'])
+        protection = CollectViewSet.cache_stampede_protection
+        try:
+            for enabled in (False, True):
+                CollectViewSet.cache_stampede_protection = enabled
+                queries = [
+                    self.expire_and_hit(options['url'], options['workers'])
+                    for _ in range(options['events'])
+                ]
+                self.stdout.write(
+                    f'protection={enabled} workers={options["workers"]} '
+                    f'queries per expiry event={sum(queries) / len(queries)}'
+                )
+        finally:
+            CollectViewSet.cache_stampede_protection = protection
+
+    def expire_and_hit(self, url: str, workers: int) -> int:
+        """Expire cache and hit endpoint from all workers at once."""
+        invalidate('collect')
+        self.queries = 0
+        barrier = threading.Barrier(workers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(
+                lambda _: self.hit(url, barrier), range(workers)
+            ))
+        return self.queries
+
+    def hit(self, url: str, barrier: threading.Barrier) -> None:
+        """Send one request and count queries of this worker."""
+        try:
+            with connection.execute_wrapper(self.count_query):
+                barrier.wait()
+                self.client.get(url)
+        finally:
+            connection.close()
+
+    def count_query(self, execute, sql, params, many, context):
+        """Count executed query."""
+        with self.lock:
+            self.queries += 1
+        return execute(sql, params, many, context)
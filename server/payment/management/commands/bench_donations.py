@@ -0,0 +1,114 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Sum
+
+from server.payment.choices import ReasonChoices
+from server.payment.models import Collect, Payment
+
+User = get_user_model()
+
+BENCH_USERNAME = 'bench_donations'
+
+
+class Command(BaseCommand):
+    """Stress benchmark for concurrent donations to one collect."""
+
+    help = 'Fire concurrent donations at one collect and check totals.'
+
+    def add_arguments(self, parser):
+        """Method for adding optional args."""
+        parser.add_argument(
+            '--donations', type=int, default=2000,
+            help='Count of donations for every run',
+        )
+        parser.add_argument(
+            '--threads', type=str, default='1,4,8,16',
+            help='Comma separated thread counts',
+        )
+        parser.add_argument(
+            '--with-target', action='store_true',
+            help='Limit collect by target amount to check overflow',
+        )
+        parser.add_argument(
+            '--modes', type=str, default='single,sharded',
+            help='Comma separated counter modes: single, sharded',
+        )
+
+    def handle(self, *args, **options):
+        """Main logic of bench_donations command."""
+        donations = options['donations']
+        user, _ = User.objects.get_or_create(
+            username=BENCH_USERNAME,
+            defaults={'email': f'{BENCH_USERNAME}@example.com'},
+        )
+        amounts = [random.randint(100, 2000) for _ in range(donations)]
+        target_amount = sum(amounts) // 2 if options['with_target'] else None
+        try:
+            for mode in options['modes'].split(','):
+                for threads in map(int, options['threads'].split(',')):
+                    self.run(user, amounts, threads, target_amount, mode)
+        finally:
+            user.delete()
+
+    def run(self, user, amounts, threads, target_amount, mode):
+        """Run one benchmark round and verify collect totals."""
+        if mode not in ('single', 'sharded'):
+            raise CommandError(f'Unknown counter mode `{mode}`.')
+        collect = Collect.objects.create(
+            user=user,
+            title=f'{BENCH_USERNAME}-{mode}-{threads}-{time.time_ns()}',
+            reason=ReasonChoices.charity,
+            description='Benchmark collect',
+            target_amount=target_amount,
+            is_sharded=mode == 'sharded',
+        )
+        chunks = [amounts[i::threads] for i in range(threads)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            accepted = sum(executor.map(
+                lambda chunk: self.donate(collect, user, chunk), chunks
+            ))
+        elapsed = time.perf_counter() - started
+        collect = Collect.objects.with_live_totals().get(pk=collect.pk)
+        totals = Payment.objects.filter(collect=collect).aggregate(
+            amount=Sum('amount', default=0), count=Count('id'),
+        )
+        if (
+            collect.live_current_amount != totals['amount']
+            or collect.live_donators_count != totals['count']
+            or totals['count'] != accepted
+            or (target_amount and collect.current_amount > target_amount)
+        ):
+            raise CommandError(
+                f'Totals mismatch for {mode} mode and {threads} threads: '
+                f'collect={collect.live_current_amount}/'
+                f'{collect.live_donators_count} '
+                f'payments={totals["amount"]}/{totals["count"]}'
+            )
+        if mode == 'sharded':
+            Collect.objects.rollup_counter_shards(collect.pk)
+            collect.refresh_from_db()
+            if collect.current_amount != totals['amount']:
+                raise CommandError(f'Rollup mismatch for {threads} threads.')
+        self.stdout.write(
+            f'mode={mode} threads={threads} donations={len(amounts)} '
+            f'accepted={accepted} time={elapsed:.2f}s '
+            f'rate={len(amounts) / elapsed:.0f}/s'
+        )
+        collect.delete()
+
+    @staticmethod
+    def donate(collect, user, amounts):
+        """Donate every amount from one thread, return accepted count."""
+        try:
+            return sum(
+                collect.add_payment(user, amount, 'benchmark') is not None
+                for amount in amounts
+            )
+        finally:
+            connection.close()
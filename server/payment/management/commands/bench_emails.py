@@ -0,0 +1,64 @@
+import random
+import time
+
+from django.core import mail
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from server.api.tasks import send_buffered_emails, send_email_task
+from server.payment.models import Payment
+
+LOCMEM_EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+
+class Command(BaseCommand):
+    """Throughput benchmark of per-payment and batched emails."""
+
+    help = 'Measure emails per second with the locmem email backend.'
+
+    def add_arguments(self, parser):
+        """Method for adding optional args."""
+        parser.add_argument(
+            '--notifications', type=int, default=2000,
+            help='Count of payment notifications',
+        )
+        parser.add_argument(
+            '--recipients', type=int, default=200,
+            help='Count of different recipients',
+        )
+
+    def handle(self, *args, **options):
+        """Main logic of bench_emails command."""
+        payment_ids = list(
+            Payment.objects.values_list('id', flat=True)[:1000]
+        )
+        if not payment_ids:
+            self.stderr.write('Fill DB with full_db command first.')
+            return
+        entries = [
+            (
+                'payment',
+                random.choice(payment_ids),
+                f'donator{random.randrange(options["recipients"])}@mail.com',
+            )
+            for _ in range(options['notifications'])
+        ]
+        with override_settings(EMAIL_BACKEND=LOCMEM_EMAIL_BACKEND):
+            mail.outbox = []
+            started = time.perf_counter()
+            for entry in entries:
+                send_email_task(*entry)
+            self.report('per-payment', len(entries), started)
+            mail.outbox = []
+            started = time.perf_counter()
+            send_buffered_emails(entries)
+            self.report('batched', len(entries), started)
+
+    def report(self, mode: str, notifications: int, started: float) -> None:
+        """Print notifications and messages per second."""
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'mode={mode} notifications={notifications} '
+            f'messages={len(mail.outbox)} time={elapsed:.2f}s '
+            f'notifications/s={notifications / elapsed:.0f}'
+        )
@@ -0,0 +1,141 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """Throughput benchmark of running WSGI and ASGI servers."""
+
+    help = 'Compare requests/s and latency of servers by concurrency.'
+
+    def add_arguments(self, parser):
+        """Method for adding optional args."""
+        parser.add_argument(
+            '--target', action='append', dest='targets',
+            help='Server as name=url, e.g. wsgi=http://localhost:8000',
+        )
+        parser.add_argument(
+            '--path', type=str, default='/api/collects/',
+            help='Endpoint for the benchmark',
+        )
+        parser.add_argument(
+            '--concurrency', type=str, default='16,64,256',
+            help='Comma separated counts of open connections',
+        )
+        parser.add_argument(
+            '--duration', type=float, default=10.0,
+            help='Seconds of load for every target and concurrency',
+        )
+
+    def handle(self, *args, **options):
+        """Main logic of bench_http command."""
+        targets = dict(
+            target.split('=', 1) for target in options['targets'] or (
+                'wsgi=http://localhost:8000', 'asgi=http://localhost:8001',
+            )
+        )
+        for name, url in targets.items():
+            for concurrency in map(int, options['concurrency'].split(',')):
+                result = asyncio.run(self.run_load(
+                    url, options['path'], concurrency, options['duration']
+                ))
+                self.report(name, concurrency, options['duration'], *result)
+
+    async def run_load(
+        self, url: str, path: str, concurrency: int, duration: float
+    ) -> tuple[list[float], int]:
+        """Send requests from concurrent connections until deadline."""
+        parts = urlsplit(url)
+        if parts.scheme != 'http':
+            raise CommandError('Only http:// targets are supported.')
+        latencies = []
+        errors = [0]
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(
+            self.connection_loop(
+                parts.hostname, parts.port or 80, path, deadline,
+                latencies, errors,
+            )
+            for _ in range(concurrency)
+        ))
+        return latencies, errors[0]
+
+    async def connection_loop(
+        self, host, port, path, deadline, latencies, errors
+    ) -> None:
+        """Keep-alive connection sending requests one after another."""
+        request = (
+            f'GET {path} HTTP/1.1\r\nHost: {host}\r\n'
+            'Accept: application/json\r\nAccept-Encoding: gzip\r\n\r\n'
+        ).encode()
+        reader = writer = None
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(host, port)
+                writer.write(request)
+                status, keep_alive = await self.read_response(reader)
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                errors[0] += 1
+                writer = self.close(writer)
+                await asyncio.sleep(0.01)
+                continue
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors[0] += 1
+            if not keep_alive:
+                writer = self.close(writer)
+        self.close(writer)
+
+    @staticmethod
+    async def read_response(reader) -> tuple[int, bool]:
+        """Read one response, return status and keep-alive flag."""
+        head = await reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split()[1])
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip().lower()
+        if headers.get('transfer-encoding') == 'chunked':
+            while size := int((await reader.readline()).strip(), 16):
+                await reader.readexactly(size + 2)
+            await reader.readline()
+        else:
+            await reader.readexactly(int(headers.get('content-length', 0)))
+        return status, headers.get('connection') != 'close'
+
+    @staticmethod
+    def close(writer) -> None:
+        """Close connection if it is open."""
+        if writer is not None:
+            writer.close()
+        return None
+
+    def report(
+        self,
+        name: str,
+        concurrency: int,
+        duration: float,
+        latencies: list[float],
+        errors: int,
+    ) -> None:
+        """Print throughput and latency percentiles."""
+        if len(latencies) < 2:
+            self.stdout.write(
+                f'{name} c={concurrency}: no successful requests, '
+                f'errors={errors}'
+            )
+            return
+        percentiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f'{name} c={concurrency}: {len(latencies) / duration:.0f} req/s '
+            f'p50={percentiles[49] * 1000:.1f}ms '
+            f'p99={percentiles[98] * 1000:.1f}ms errors={errors}'
+        )
@@ -0,0 +1,111 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from server.payment.choices import ReasonChoices
+from server.payment.models import Collect
+
+User = get_user_model()
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+class Rollback(Exception):
+    """Raised to roll back fixture data of the check."""
+
+
+class Command(BaseCommand):
+    """Query-count regression check for list and detail endpoints."""
+
+    help = (
+        'Fail when list or detail endpoints run more queries for a page '
+        'with more rows.'
+    )
+
+    def add_arguments(self, parser):
+        """Method for adding optional args."""
+        parser.add_argument(
+            '--max-queries', type=int, default=8,
+            help='Upper bound of queries for one endpoint',
+        )
+        parser.add_argument(
+            '--host', type=str, default='localhost',
+            help='Host header allowed by ALLOWED_HOSTS',
+        )
+
+    def handle(self, *args, **options):
+        """Main logic of check_queries command."""
+        self.client = APIClient(HTTP_HOST=options['host'])
+        try:
+            with override_settings(CACHES=LOCMEM_CACHES):
+                with transaction.atomic():
+                    failures = self.check_endpoints(options['max_queries'])
+                    raise Rollback
+        except Rollback:
+            pass
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS(
+            '✅ Query counts do not depend on page size!'
+        ))
+
+    def check_endpoints(self, max_queries: int) -> list[str]:
+        """Measure endpoints with small and full pages of fixture data."""
+        user = User.objects.create(
+            username='check_queries', email='check_queries@example.com'
+        )
+        self.add_collects(user, 1)
+        small = self.measure(user)
+        self.add_collects(user, 10)
+        full = self.measure(user)
+        failures = []
+        for name, count in full.items():
+            self.stdout.write(f'{name}: {small[name]} -> {count} queries')
+            if count != small[name] or count > max_queries:
+                failures.append(
+                    f'{name} runs {count} queries, '
+                    f'{small[name]} for smaller page, limit {max_queries}'
+                )
+        return failures
+
+    def add_collects(self, user, count: int) -> None:
+        """Create collects with payments, one of them sharded."""
+        for _ in range(count):
+            number = Collect.objects.count()
+            collect = Collect.objects.create(
+                user=user,
+                title=f'check_queries-{number}',
+                reason=ReasonChoices.charity,
+                description='Query count check',
+                is_sharded=number % 2 == 0,
+            )
+            for amount in (100, 200, 300):
+                collect.add_payment(user, amount, 'check')
+
+    def measure(self, user) -> dict[str, int]:
+        """Count queries of every read endpoint."""
+        collect = Collect.objects.filter(user=user).first()
+        payment = collect.payments.first()
+        urls = {
+            'collect-list': '/api/collects/',
+            'collect-detail': f'/api/collects/{collect.pk}/',
+            'payment-list': '/api/payments/',
+            'payment-detail': f'/api/payments/{payment.pk}/',
+            'user-list': '/api/users/',
+        }
+        counts = {}
+        for name, url in urls.items():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f'{url} returned {response.status_code}')
+            counts[name] = len(queries)
+        return counts
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from server.payment.models import Collect
+
+
+class Command(BaseCommand):
+    """Class for collect_sharding command."""
+
+    help = 'Enable or disable sharded counters for collects.'
+
+    def add_arguments(self, parser):
+        """Method for adding optional args."""
+        parser.add_argument(
+            'collect_ids', nargs='+', type=int, help='Ids of collects'
+        )
+        parser.add_argument(
+            '--disable', action='store_true',
+            help='Roll up shards and return to single row counters',
+        )
+
+    def handle(self, *args, **options):
+        """Main logic of collect_sharding command."""
+        collect_ids = options['collect_ids']
+        collects = Collect.objects.filter(pk__in=collect_ids)
+        if collects.count() != len(set(collect_ids)):
+            raise CommandError('Some collects do not exist.')
+        if options['disable']:
+            collects.update(is_sharded=False)
+            for collect_id in collect_ids:
+                Collect.objects.rollup_counter_shards(collect_id)
+            self.stdout.write(self.style.SUCCESS(
+                '✅ Sharded counters were disabled!'
+            ))
+            return
+        if collects.filter(target_amount__isnull=False).exists():
+            self.stdout.write(self.style.WARNING(
+                'Collects with target amount keep single row counters.'
+            ))
+        collects.update(is_sharded=True)
+        self.stdout.write(self.style.SUCCESS(
+            '✅ Sharded counters were enabled!'
+        ))
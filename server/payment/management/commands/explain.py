@@ -0,0 +1,87 @@
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import HttpRequest
+from rest_framework.request import Request
+
+from server.api.views import CollectViewSet, PaymentViewSet, UserViewset
+
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)\b(?! USING (?:COVERING )?INDEX)'),
+}
+VIEWSETS = (UserViewset, PaymentViewSet, CollectViewSet)
+
+
+class Command(BaseCommand):
+    """Class for explain command."""
+
+    help = 'EXPLAIN ANALYZE default querysets of viewsets.'
+
+    def add_arguments(self, parser):
+        """Method for adding optional args."""
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Print full plans, not only found sequential scans',
+        )
+        parser.add_argument(
+            '--fail-on-seq-scan', action='store_true',
+            help='Exit with error when any sequential scan is found',
+        )
+
+    def handle(self, *args, **options):
+        """Main logic of explain command."""
+        pattern = SEQ_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(
+                f'EXPLAIN is not supported for {connection.vendor}.'
+            )
+        found = []
+        for name, queryset in self.querysets():
+            plan = self.explain(queryset)
+            tables = pattern.findall(plan)
+            if options['verbose_plans']:
+                self.stdout.write(f'--- {name}\n{plan}')
+            if tables:
+                found.append(name)
+                self.stdout.write(self.style.WARNING(
+                    f'{name}: sequential scan on {", ".join(tables)}'
+                ))
+            else:
+                self.stdout.write(f'{name}: ok')
+        if found and options['fail_on_seq_scan']:
+            raise CommandError(
+                f'Sequential scans found in: {", ".join(found)}'
+            )
+
+    @staticmethod
+    def querysets():
+        """Yield querysets which viewsets run for list and retrieve."""
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        for viewset_class in VIEWSETS:
+            for action in ('list', 'retrieve'):
+                viewset = viewset_class(
+                    action=action,
+                    request=Request(HttpRequest()),
+                    format_kwarg=None,
+                    kwargs={},
+                )
+                queryset = viewset.get_queryset()
+                name = f'{viewset_class.__name__}.{action}'
+                if action == 'list':
+                    yield name, queryset[:page_size]
+                else:
+                    yield name, queryset.filter(pk=1)
+        collect_payments = CollectViewSet.payments.kwargs['pagination_class']
+        yield 'CollectViewSet.payments', PaymentViewSet.queryset.filter(
+            collect_id=1
+        ).order_by(*collect_payments.ordering)[:page_size]
+
+    @staticmethod
+    def explain(queryset) -> str:
+        """Return plan of queryset, analyzed when database supports it."""
+        if connection.vendor == 'postgresql':
+            return queryset.explain(analyze=True)
+        return queryset.explain()
@@ -1,15 +1,117 @@
+import math
+import multiprocessing
 import random
+import time
 
 from django.contrib.auth import get_user_model
-from django.core.management.base import BaseCommand
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
 from faker import Faker
 
 from server.payment.choices import ReasonChoices
-from server.payment.models import Collect
+from server.payment.models import Collect, Payment
+from server.src.db_pool import close_connection_pools, forget_connection_pools
 
 User = get_user_model()
 fake = Faker('ru_RU')
 
+TEXT_POOL_SIZE = 1000
+PAYMENT_AMOUNT_RANGE = (100, 2000)
+TOTAL_FIELDS = ('current_amount', 'donators_count', 'is_finished', 'finished_at')
+PAYMENT_COPY_COLUMNS = (
+    'user_id', 'collect_id', 'amount', 'comment', 'created_at', 'updated_at'
+)
+
+
+def generate_payments(
+    seed: int,
+    collects: list[tuple[int, int | None]],
+    payments_count: int,
+    user_ids: list[int],
+    batch_size: int,
+    use_copy: bool,
+) -> int:
+    """Insert payments for own part of collects and write their totals.
+
+    Every collect belongs to exactly one part, so totals are summed in
+    memory and written once per collect. Returns count of payments.
+    """
+    rng = random.Random(seed)
+    local_fake = Faker('ru_RU')
+    local_fake.seed_instance(seed)
+    comments = [
+        local_fake.sentence(nb_words=6) for _ in range(TEXT_POOL_SIZE)
+    ]
+    totals = {pk: [0, 0, target] for pk, target in collects}
+    open_ids = [pk for pk, _ in collects]
+    finished_at = {}
+    now = timezone.now()
+    batch = []
+    created = 0
+    while created + len(batch) < payments_count and open_ids:
+        index = rng.randrange(len(open_ids))
+        pk = open_ids[index]
+        total = totals[pk]
+        amount = rng.randint(*PAYMENT_AMOUNT_RANGE)
+        if total[2] is not None:
+            amount = min(amount, total[2] - total[0])
+        total[0] += amount
+        total[1] += 1
+        if total[2] is not None and total[0] >= total[2]:
+            open_ids[index] = open_ids[-1]
+            open_ids.pop()
+            finished_at[pk] = now
+        batch.append((rng.choice(user_ids), pk, amount, rng.choice(comments)))
+        if len(batch) == batch_size:
+            created += insert_payments(batch, now, use_copy)
+            batch = []
+    created += insert_payments(batch, now, use_copy)
+    Collect.objects.bulk_update(
+        [
+            Collect(
+                pk=pk,
+                current_amount=amount,
+                donators_count=donators_count,
+                is_finished=pk in finished_at,
+                finished_at=finished_at.get(pk),
+            )
+            for pk, (amount, donators_count, _) in totals.items()
+        ],
+        TOTAL_FIELDS,
+        batch_size=batch_size,
+    )
+    connection.close()
+    return created
+
+
+def insert_payments(rows: list[tuple], now, use_copy: bool) -> int:
+    """Write batch of payments by bulk INSERT or PostgreSQL COPY."""
+    if not rows:
+        return 0
+    if not use_copy:
+        Payment.objects.bulk_create(
+            Payment(user_id=user_id, collect_id=collect_id,
+                    amount=amount, comment=comment)
+            for user_id, collect_id, amount, comment in rows
+        )
+        return len(rows)
+    table = connection.ops.quote_name(Payment._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        with cursor.copy(
+            f'COPY {table} ({", ".join(PAYMENT_COPY_COLUMNS)}) FROM STDIN'
+        ) as copy:
+            for row in rows:
+                copy.write_row((*row, now, now))
+    return len(rows)
+
+
+def run_task(task: tuple) -> int:
+    """Unpack arguments of payments task for the worker pool."""
+    return generate_payments(*task)
+
 
 class Command(BaseCommand):
     """Class for full_db command."""
@@ -30,54 +132,156 @@ class Command(BaseCommand):
         parser.add_argument(
             '--flush', action='store_true', help='Delete db'
         )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Count of rows in one INSERT or COPY batch',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Count of processes generating payments',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Seed of generated data, same seed gives same data',
+        )
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Stream payments with PostgreSQL COPY',
+        )
 
     def handle(self, *args, **options):
         """Main logic of full_db command."""
         users_count = options['users']
         collects_count = options['collects']
         payments_count = options['payments']
+        batch_size = options['batch_size']
         flush = options['flush']
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy is supported only on PostgreSQL.')
+        if users_count < 1 or (payments_count and collects_count < 1):
+            raise CommandError('Payments need at least one user and collect.')
+        random.seed(options['seed'])
+        fake.seed_instance(options['seed'])
         if flush:
             self.stdout.write('🗑 Delete previous data...')
             User.objects.all().delete()
             Collect.objects.all().delete()
 
         self.stdout.write('👤 Сreate users...')
-        users = [
-            User.objects.create_user(
+        password = make_password('123456')
+        user_ids = self.bulk_create(User, (
+            User(
                 username=fake.user_name() + str(i),
                 email=fake.email(),
-                password='123456',
+                password=password,
             )
             for i in range(users_count)
-        ]
+        ), users_count, batch_size)
+
         self.stdout.write('📦 Create collects...')
-        collects = []
-        for i in range(collects_count):
-            user = random.choice(users)
-            collect = Collect.objects.create(
-                user=user,
-                title=fake.sentence(nb_words=3),
+        descriptions = [
+            fake.text(max_nb_chars=200) for _ in range(TEXT_POOL_SIZE)
+        ]
+        collects = [
+            Collect(
+                user_id=random.choice(user_ids),
+                title=f'{fake.sentence(nb_words=3)} #{i}',
                 reason=random.choice(ReasonChoices.values),
-                description=fake.text(max_nb_chars=200),
+                description=random.choice(descriptions),
                 target_amount=random.choice(
                     [None, random.randint(5000, 20000)]
                 ),
                 current_amount=0,
                 donators_count=0,
             )
-            collects.append(collect)
+            for i in range(collects_count)
+        ]
+        collect_ids = self.bulk_create(
+            Collect, collects, collects_count, batch_size
+        )
 
         self.stdout.write('💰 Create payments...')
-        for _ in range(payments_count):
-            user = random.choice(users)
-            collect = random.choice(collects)
-            collect.add_payment(
-                user=user,
-                amount=random.randint(100, 2000),
-                comment=fake.sentence(nb_words=6),
-            )
-
+        self.create_payments(
+            list(zip(collect_ids, (c.target_amount for c in collects))),
+            user_ids,
+            options,
+        )
+        call_command('rebuild_stats', stdout=self.stdout)
         self.stdout.write(self.style.SUCCESS(
             '✅ Database was updated and fulled new data!'
         ))
+
+    def bulk_create(self, model, objects, count: int, batch_size: int):
+        """Insert objects in batches with progress, return their ids."""
+        ids = []
+        started = time.perf_counter()
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) == batch_size:
+                ids.extend(self.insert_batch(model, batch))
+                self.progress(len(ids), count, started)
+                batch = []
+        if batch:
+            ids.extend(self.insert_batch(model, batch))
+            self.progress(len(ids), count, started)
+        return ids
+
+    @staticmethod
+    def insert_batch(model, batch: list) -> list[int]:
+        """Insert one batch and return primary keys of its rows."""
+        return [obj.pk for obj in model.objects.bulk_create(batch)]
+
+    def create_payments(
+        self,
+        collects: list[tuple[int, int | None]],
+        user_ids: list[int],
+        options: dict,
+    ) -> None:
+        """Split collects into seeded tasks and run them in workers.
+
+        Tasks do not depend on count of workers, so the same seed
+        gives the same data with any --workers value.
+        """
+        payments_count = options['payments']
+        if not payments_count:
+            return
+        tasks_count = max(1, min(
+            len(collects), math.ceil(payments_count / options['batch_size'])
+        ))
+        tasks = []
+        for index in range(tasks_count):
+            part = collects[index::tasks_count]
+            tasks.append((
+                options['seed'] + index,
+                part,
+                payments_count // tasks_count
+                + (index < payments_count % tasks_count),
+                user_ids,
+                options['batch_size'],
+                options['copy'],
+            ))
+        started = time.perf_counter()
+        created = 0
+        if options['workers'] == 1:
+            for result in map(run_task, tasks):
+                created += result
+                self.progress(created, payments_count, started)
+            return
+        # Workers must not share sockets of pooled connections with the
+        # parent, so pools are closed before fork and dropped in workers.
+        close_connection_pools()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(
+            options['workers'], initializer=forget_connection_pools
+        ) as pool:
+            for result in pool.imap_unordered(run_task, tasks):
+                created += result
+                self.progress(created, payments_count, started)
+
+    def progress(self, done: int, total: int, started: float) -> None:
+        """Print count of inserted rows and insert rate."""
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.stdout.write(
+            f'   {done}/{total} rows, {done / elapsed:,.0f} rows/s'
+        )
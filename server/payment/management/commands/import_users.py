@@ -0,0 +1,177 @@
+import csv
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import batched
+
+from django.contrib.auth import get_user_model, password_validation
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+User = get_user_model()
+
+IMPORT_COLUMNS = ('username', 'email', 'password')
+
+
+def hash_rows(
+    rows: tuple[tuple[int, str, str, str], ...], validate: bool
+) -> list[tuple[int, str, str, str | None, list[str]]]:
+    """Validate and hash passwords of (line, username, email, password).
+
+    Returns (line, username, email, encoded password or None, errors).
+    Runs in worker processes, validators are inherited from the parent.
+    """
+    results = []
+    for line, username, email, password in rows:
+        errors = []
+        if not username or not password:
+            errors.append('Username and password are required.')
+        elif validate:
+            try:
+                password_validation.validate_password(
+                    password, User(username=username, email=email)
+                )
+            except ValidationError as error:
+                errors.extend(error.messages)
+        results.append((
+            line,
+            username,
+            email,
+            None if errors else make_password(password),
+            errors,
+        ))
+    return results
+
+
+class Command(BaseCommand):
+    """Bulk import of users with passwords hashed in a process pool."""
+
+    help = 'Import users from CSV file with username, email, password.'
+
+    def add_arguments(self, parser):
+        """Method for adding optional args."""
+        parser.add_argument('path', type=str, help='CSV file with header')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Count of processes hashing passwords',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Count of users hashed by one task and inserted at once',
+        )
+        parser.add_argument(
+            '--skip-validation', action='store_true',
+            help='Do not check passwords with AUTH_PASSWORD_VALIDATORS',
+        )
+
+    def handle(self, *args, **options):
+        """Main logic of import_users command."""
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('Workers and batch size must be positive.')
+        with open(options['path'], newline='', encoding='utf-8') as file:
+            reader = csv.DictReader(file)
+            missing = set(IMPORT_COLUMNS) - set(reader.fieldnames or ())
+            if missing:
+                raise CommandError(
+                    f'Missing columns: {", ".join(sorted(missing))}.'
+                )
+            rows = (
+                (
+                    reader.line_num,
+                    (row['username'] or '').strip(),
+                    (row['email'] or '').strip(),
+                    row['password'] or '',
+                )
+                for row in reader
+            )
+            self.import_rows(
+                batched(rows, options['batch_size']),
+                options['workers'],
+                not options['skip_validation'],
+            )
+
+    def import_rows(self, batches, workers: int, validate: bool) -> None:
+        """Hash batches in the pool and insert them in file order.
+
+        At most two batches per worker are in flight, so memory does
+        not grow with the size of the file.
+        """
+        password_validation.get_default_password_validators()
+        connections.close_all()
+        counts = {'created': 0, 'existing': 0, 'invalid': 0}
+        seen = set()
+        started = time.perf_counter()
+        pending = deque()
+        with ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('fork')
+        ) as executor:
+            # Pool forks all workers on first submit, before any query
+            # opens a connection which workers would inherit.
+            executor.submit(int).result()
+            for batch in batches:
+                batch = self.new_rows(batch, seen, counts)
+                if not batch:
+                    continue
+                pending.append(executor.submit(hash_rows, batch, validate))
+                if len(pending) >= workers * 2:
+                    self.insert(pending.popleft().result(), counts)
+                    self.progress(counts, started)
+            while pending:
+                self.insert(pending.popleft().result(), counts)
+                self.progress(counts, started)
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Created {counts["created"]} users, skipped '
+            f'{counts["existing"]} existing and {counts["invalid"]} invalid.'
+        ))
+
+    @staticmethod
+    def new_rows(batch: tuple, seen: set, counts: dict) -> tuple:
+        """Rows of users which are not in database or earlier rows.
+
+        Existing users are dropped before hashing, so a repeated import
+        costs one query per batch.
+        """
+        existing = set(User.objects.filter(
+            username__in=[username for _, username, *_ in batch]
+        ).values_list('username', flat=True))
+        rows = []
+        for row in batch:
+            if row[1] in existing or row[1] in seen:
+                counts['existing'] += 1
+            else:
+                seen.add(row[1])
+                rows.append(row)
+        return tuple(rows)
+
+    def insert(self, results: list[tuple], counts: dict) -> None:
+        """Insert hashed users, report rows which failed validation.
+
+        Users created meanwhile are skipped by the insert, salted hashes
+        tell which rows were actually inserted.
+        """
+        users = []
+        for line, username, email, password, errors in results:
+            if errors:
+                counts['invalid'] += 1
+                self.stderr.write(f'Line {line}: {" ".join(errors)}')
+            else:
+                users.append(
+                    User(username=username, email=email, password=password)
+                )
+        User.objects.bulk_create(users, ignore_conflicts=True)
+        created = User.objects.filter(
+            username__in=[user.username for user in users],
+            password__in=[user.password for user in users],
+        ).count()
+        counts['created'] += created
+        counts['existing'] += len(users) - created
+
+    def progress(self, counts: dict, started: float) -> None:
+        """Print count of processed rows and hashing rate."""
+        done = sum(counts.values())
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.stdout.write(f'   {done} rows, {done / elapsed:,.0f} rows/s')
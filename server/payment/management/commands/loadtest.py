@@ -0,0 +1,495 @@
+import http.client
+import json
+import math
+import random
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+
+from server.api.authentication import ClaimsTokenObtainPairSerializer
+from server.payment.choices import ReasonChoices
+from server.payment.models import Collect, Payment
+
+User = get_user_model()
+
+BENCH_USERNAME = 'bench_loadtest'
+IN_PROCESS = 'in-process'
+ID_POOL_SIZE = 1000
+LIST_PAGES = 5
+PAYMENT_AMOUNT_RANGE = (1, 100)
+# Rows of full_db for --scale 1.
+SCALE_ROWS = {'users': 100, 'collects': 1000, 'payments': 20000}
+QUERIES_PATTERN = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def page(rng, pool: list[int]) -> int:
+    """Random page of first LIST_PAGES pages which exist for pool."""
+    pages = -(-len(pool) // settings.REST_FRAMEWORK['PAGE_SIZE'])
+    return rng.randint(1, max(1, min(LIST_PAGES, pages)))
+
+
+def list_collects(rng, pools, name):
+    return 'GET', f'/api/collects/?page={page(rng, pools["collects"])}', None
+
+
+def retrieve_collect(rng, pools, name):
+    return 'GET', f'/api/collects/{rng.choice(pools["collects"])}/', None
+
+
+def list_payments(rng, pools, name):
+    return 'GET', f'/api/payments/?page={page(rng, pools["payments"])}', None
+
+
+def retrieve_payment(rng, pools, name):
+    return 'GET', f'/api/payments/{rng.choice(pools["payments"])}/', None
+
+
+def list_users(rng, pools, name):
+    return 'GET', f'/api/users/?page={page(rng, pools["users"])}', None
+
+
+def retrieve_user(rng, pools, name):
+    return 'GET', f'/api/users/{rng.choice(pools["users"])}/', None
+
+
+def create_payment(rng, pools, name):
+    return 'POST', '/api/payments/', {
+        'collect_id': rng.choice(pools['open_collects']),
+        'amount': rng.randint(*PAYMENT_AMOUNT_RANGE),
+        'comment': f'Load test {name}',
+    }
+
+
+def create_collect(rng, pools, name):
+    return 'POST', '/api/collects/', {
+        'title': f'Load test {name}',
+        'reason': rng.choice(ReasonChoices.values),
+        'description': 'Collect created by load test',
+        'target_amount': rng.choice([None, rng.randint(5000, 20000)]),
+    }
+
+
+def create_user(rng, pools, name):
+    return 'POST', '/api/users/', {
+        'username': f'loadtest-{name}',
+        'email': f'loadtest-{name}@example.com',
+        'password': f'pw-{rng.getrandbits(64):016x}',
+    }
+
+
+SCENARIOS = {
+    scenario.__name__: scenario
+    for scenario in (
+        list_collects,
+        retrieve_collect,
+        list_payments,
+        retrieve_payment,
+        list_users,
+        retrieve_user,
+        create_payment,
+        create_collect,
+        create_user,
+    )
+}
+MIXES = {
+    'read': {
+        'list_collects': 30,
+        'retrieve_collect': 25,
+        'list_payments': 20,
+        'retrieve_payment': 10,
+        'list_users': 10,
+        'retrieve_user': 5,
+    },
+    'write': {
+        'create_payment': 70,
+        'create_collect': 15,
+        'create_user': 5,
+        'retrieve_collect': 10,
+    },
+    'mixed': {
+        'list_collects': 25,
+        'retrieve_collect': 20,
+        'list_payments': 15,
+        'retrieve_payment': 10,
+        'list_users': 5,
+        'retrieve_user': 5,
+        'create_payment': 15,
+        'create_collect': 4,
+        'create_user': 1,
+    },
+}
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    """Weights of scenarios from mix name or 'scenario=weight,...'."""
+    if value in MIXES:
+        return MIXES[value]
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in SCENARIOS or not weight.isdigit():
+            raise CommandError(
+                f'Unknown mix `{value}`, use one of {", ".join(MIXES)} '
+                f'or scenario=weight pairs of {", ".join(SCENARIOS)}.'
+            )
+        mix[name] = int(weight)
+    return mix
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def summarize(samples: list[tuple], duration: float) -> dict:
+    """Throughput, latency percentiles and query counts of samples."""
+    latencies = sorted(latency for _, latency, _ in samples)
+    queries = [count for _, _, count in samples if count is not None]
+    statuses = {}
+    for status, _, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for status, _, _ in samples if not 0 < status < 400),
+        'throughput_rps': round(len(samples) / duration, 1),
+        'latency_ms': {
+            'mean': round(statistics.fmean(latencies) * 1000, 2),
+            'p50': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99': round(percentile(latencies, 0.99) * 1000, 2),
+            'max': round(latencies[-1] * 1000, 2),
+        },
+        'queries': {
+            'mean': round(statistics.fmean(queries), 2),
+            'max': max(queries),
+        } if queries else None,
+        'statuses': dict(sorted(statuses.items())),
+    }
+
+
+def header_queries(server_timing: str | None) -> int | None:
+    """Count of queries from Server-Timing header of response."""
+    match = QUERIES_PATTERN.search(server_timing or '')
+    return int(match[1]) if match else None
+
+
+class InProcessTransport:
+    """Requests through Django test client, no network in between."""
+
+    def __init__(self, token: str):
+        self.client = Client(
+            raise_request_exception=False,
+            HTTP_AUTHORIZATION=f'Bearer {token}',
+            HTTP_ACCEPT='application/json',
+        )
+
+    def send(self, method: str, path: str, payload) -> tuple[int, int | None]:
+        response = self.client.generic(
+            method,
+            path,
+            json.dumps(payload) if payload is not None else '',
+            content_type='application/json',
+        )
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response.status_code, header_queries(
+            response.headers.get('Server-Timing')
+        )
+
+    def close(self) -> None:
+        connection.close()
+
+
+class HTTPTransport:
+    """Requests over keep-alive connection to running server."""
+
+    def __init__(self, token: str, url: str):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.headers = {
+            'Authorization': f'Bearer {token}',
+            'Accept': 'application/json',
+            'Content-Type': 'application/json',
+        }
+        self.connection = None
+
+    def send(self, method: str, path: str, payload) -> tuple[int, int | None]:
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(
+                self.host, self.port, timeout=30
+            )
+        try:
+            self.connection.request(
+                method,
+                path,
+                json.dumps(payload) if payload is not None else None,
+                self.headers,
+            )
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            return 0, None
+        if response.will_close:
+            self.close()
+        return response.status, header_queries(
+            response.getheader('Server-Timing')
+        )
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class Command(BaseCommand):
+    """Load test of the API with scripted traffic mixes."""
+
+    help = (
+        'Replay list, retrieve and create traffic against the API '
+        'in process or against a running server, print JSON report.'
+    )
+
+    def add_arguments(self, parser):
+        """Method for adding optional args."""
+        parser.add_argument(
+            '--scale', type=float, default=0,
+            help=(
+                'Reseed database with full_db, 1 means '
+                + ', '.join(f'{count} {name}' for name, count in SCALE_ROWS.items())
+                + '; 0 keeps current data'
+            ),
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Seed of generated data and traffic',
+        )
+        parser.add_argument(
+            '--mix', type=str, default='mixed',
+            help=(
+                f'Traffic mix: {", ".join(MIXES)} '
+                'or scenario=weight pairs, e.g. list_collects=3,create_payment=1'
+            ),
+        )
+        parser.add_argument(
+            '--requests', type=int, default=2000,
+            help='Count of measured requests',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=100,
+            help='Count of requests before measuring',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Count of concurrent clients',
+        )
+        parser.add_argument(
+            '--target', type=str, default=IN_PROCESS,
+            help=(
+                f'{IN_PROCESS} or URL of server started with the same '
+                'settings, e.g. http://127.0.0.1:8000'
+            ),
+        )
+        parser.add_argument(
+            '--output', type=Path,
+            help='Write report to file instead of stdout',
+        )
+        parser.add_argument(
+            '--baseline', type=Path,
+            help='Previous report, fail when this run is slower',
+        )
+        parser.add_argument(
+            '--max-regression', type=float, default=0.2,
+            help='Allowed relative growth of p95 latency over baseline',
+        )
+
+    def handle(self, *args, **options):
+        """Main logic of loadtest command."""
+        mix = parse_mix(options['mix'])
+        target = options['target']
+        if target != IN_PROCESS and urlsplit(target).scheme != 'http':
+            raise CommandError('Only in-process and http:// targets are supported.')
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('Requests and concurrency must be positive.')
+        if options['scale']:
+            self.reseed(options['scale'], options['seed'])
+        pools = self.id_pools()
+        missing = [
+            name for name in mix
+            if any(not pools[pool] for pool in self.scenario_pools(name))
+        ]
+        if missing:
+            raise CommandError(
+                f'No data for {", ".join(missing)}, run with --scale.'
+            )
+        user, _ = User.objects.get_or_create(
+            username=BENCH_USERNAME,
+            defaults={'email': f'{BENCH_USERNAME}@example.com'},
+        )
+        token = str(
+            ClaimsTokenObtainPairSerializer.get_token(user).access_token
+        )
+        run_id = time.time_ns()
+        if options['warmup']:
+            self.run(
+                options['warmup'], options['concurrency'], mix, pools,
+                target, token, options['seed'] - 1, f'{run_id}-w',
+            )
+        samples, duration = self.run(
+            options['requests'], options['concurrency'], mix, pools,
+            target, token, options['seed'], str(run_id),
+        )
+        report = self.build_report(samples, duration, mix, options)
+        content = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            options['output'].write_text(content + '\n')
+        else:
+            self.stdout.write(content)
+        if options['baseline']:
+            self.compare(report, options['baseline'], options['max_regression'])
+
+    def reseed(self, scale: float, seed: int) -> None:
+        """Replace data with full_db rows of scale, progress to stderr."""
+        call_command(
+            'full_db',
+            flush=True,
+            seed=seed,
+            stdout=self.stderr,
+            **{
+                name: max(1, round(count * scale))
+                for name, count in SCALE_ROWS.items()
+            },
+        )
+        cache.clear()
+
+    @staticmethod
+    def id_pools() -> dict[str, list[int]]:
+        """Primary keys which scenarios pick from."""
+        return {
+            'users': list(
+                User.objects.order_by('pk')
+                .values_list('pk', flat=True)[:ID_POOL_SIZE]
+            ),
+            'collects': list(
+                Collect.objects.order_by('pk')
+                .values_list('pk', flat=True)[:ID_POOL_SIZE]
+            ),
+            'open_collects': list(
+                Collect.objects.filter(is_finished=False).order_by('pk')
+                .values_list('pk', flat=True)[:ID_POOL_SIZE]
+            ),
+            'payments': list(
+                Payment.objects.order_by('pk')
+                .values_list('pk', flat=True)[:ID_POOL_SIZE]
+            ),
+        }
+
+    @staticmethod
+    def scenario_pools(name: str) -> tuple[str, ...]:
+        """Pools which scenario needs to be non-empty."""
+        return {
+            'retrieve_collect': ('collects',),
+            'retrieve_payment': ('payments',),
+            'retrieve_user': ('users',),
+            'create_payment': ('open_collects',),
+        }.get(name, ())
+
+    def run(
+        self, count, concurrency, mix, pools, target, token, seed, run_id
+    ) -> tuple[list[tuple], float]:
+        """Send count requests from concurrent clients.
+
+        Returns (scenario, status, seconds, queries) samples and wall
+        time. Every client has own seeded generator, so the same seed
+        replays the same traffic.
+        """
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        samples = []
+        lock = threading.Lock()
+
+        def client(index: int) -> None:
+            rng = random.Random(f'{seed}-{index}')
+            transport = (
+                InProcessTransport(token) if target == IN_PROCESS
+                else HTTPTransport(token, target)
+            )
+            own = []
+            try:
+                for number in range(index, count, concurrency):
+                    name = rng.choices(names, weights)[0]
+                    method, path, payload = SCENARIOS[name](
+                        rng, pools, f'{run_id}-{number}'
+                    )
+                    started = time.perf_counter()
+                    status, queries = transport.send(method, path, payload)
+                    own.append((
+                        name, status, time.perf_counter() - started, queries
+                    ))
+            finally:
+                transport.close()
+            with lock:
+                samples.extend(own)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(client, range(concurrency)))
+        return samples, time.perf_counter() - started
+
+    @staticmethod
+    def build_report(samples, duration, mix, options) -> dict:
+        """JSON report with totals and per scenario numbers."""
+        by_scenario = {}
+        for name, *sample in samples:
+            by_scenario.setdefault(name, []).append(sample)
+        return {
+            'target': options['target'],
+            'database': connection.vendor,
+            'cache': settings.CACHES['default']['BACKEND'],
+            'mix': mix,
+            'concurrency': options['concurrency'],
+            'seed': options['seed'],
+            'duration_s': round(duration, 3),
+            'total': summarize(
+                [sample for _, *sample in samples], duration
+            ),
+            'scenarios': {
+                name: summarize(by_scenario[name], duration)
+                for name in mix if name in by_scenario
+            },
+        }
+
+    def compare(self, report: dict, path: Path, max_regression: float) -> None:
+        """Fail when p95 latency of any scenario grew over the limit."""
+        baseline = json.loads(path.read_text())
+        regressions = []
+        sections = {'total': report['total'], **report['scenarios']}
+        previous = {'total': baseline['total'], **baseline['scenarios']}
+        for name, section in sections.items():
+            if name not in previous:
+                continue
+            before = previous[name]['latency_ms']['p95']
+            after = section['latency_ms']['p95']
+            if before and after > before * (1 + max_regression):
+                regressions.append(
+                    f'{name}: p95 {before}ms -> {after}ms'
+                )
+        if regressions:
+            raise CommandError(
+                'Latency regressions over baseline:\n' + '\n'.join(regressions)
+            )
+        self.stderr.write(self.style.SUCCESS('No regressions over baseline.'))
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncHour
+
+from server.api.leaderboard import rebuild_leaderboards
+from server.api.redis_utils import get_redis_client
+from server.api.tasks import DONATION_STATS_KEY, DONATION_STATS_PROCESSING_KEY
+from server.payment.models import (
+    CollectHourlyStats,
+    Payment,
+    ReasonHourlyStats,
+)
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    """Class for rebuild_stats command."""
+
+    help = 'Rebuild hourly statistics and leaderboards from payments.'
+
+    def handle(self, *args, **options):
+        """Main logic of rebuild_stats command."""
+        buckets = Payment.objects.annotate(
+            hour=TruncHour('created_at')
+        ).order_by()
+        redis_client = get_redis_client()
+        with transaction.atomic():
+            if redis_client is not None:
+                # Buffered increments are already counted from payments.
+                redis_client.delete(
+                    DONATION_STATS_KEY, DONATION_STATS_PROCESSING_KEY
+                )
+            CollectHourlyStats.objects.all().delete()
+            ReasonHourlyStats.objects.all().delete()
+            collect_rows = CollectHourlyStats.objects.bulk_create(
+                (
+                    CollectHourlyStats(**row)
+                    for row in buckets.values('collect_id', 'hour').annotate(
+                        amount=Sum('amount'), donations_count=Count('id')
+                    ).iterator(chunk_size=BATCH_SIZE)
+                ),
+                batch_size=BATCH_SIZE,
+            )
+            reason_rows = ReasonHourlyStats.objects.bulk_create(
+                (
+                    ReasonHourlyStats(
+                        reason=row['collect__reason'],
+                        hour=row['hour'],
+                        amount=row['amount'],
+                        donations_count=row['donations_count'],
+                    )
+                    for row in buckets.values(
+                        'collect__reason', 'hour'
+                    ).annotate(
+                        amount=Sum('amount'), donations_count=Count('id')
+                    ).iterator(chunk_size=BATCH_SIZE)
+                ),
+                batch_size=BATCH_SIZE,
+            )
+        self.stdout.write(
+            f'📊 Hourly buckets: {len(collect_rows)} of collects, '
+            f'{len(reason_rows)} of reasons'
+        )
+        self.stdout.write(
+            f'🏆 Collects in leaderboards: {rebuild_leaderboards()}'
+        )
+        self.stdout.write(self.style.SUCCESS('✅ Statistics were rebuilt!'))
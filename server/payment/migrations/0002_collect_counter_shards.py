@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collect',
+            name='is_sharded',
+            field=models.BooleanField(default=False, help_text='Spread payments of collect without target over shards', verbose_name='Sharded counters'),
+        ),
+        migrations.CreateModel(
+            name='CollectCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField(verbose_name='Shard index')),
+                ('amount', models.PositiveBigIntegerField(default=0, verbose_name='Amount of money')),
+                ('donators_count', models.PositiveIntegerField(default=0, verbose_name='Donators count')),
+                ('collect', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counter_shards', to='payment.collect')),
+            ],
+            options={
+                'verbose_name': 'Collect counter shard',
+                'verbose_name_plural': 'Collect counter shards',
+                'constraints': [models.UniqueConstraint(fields=('collect', 'index'), name='unique_collect_counter_shard')],
+            },
+        ),
+    ]
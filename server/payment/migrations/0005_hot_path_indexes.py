@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0004_cursor_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='payment',
+            name='payment_collect_recent_idx',
+        ),
+        migrations.AddIndex(
+            model_name='collect',
+            index=models.Index(condition=models.Q(('is_finished', False)), fields=['-created_at', '-id'], name='collect_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='collect',
+            index=models.Index(fields=['reason', '-created_at'], name='collect_reason_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='collect',
+            index=models.Index(fields=['title', 'target_amount', 'current_amount'], name='collect_ordering_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['collect', '-created_at', '-id'], include=('amount',), name='payment_collect_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0005_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collect',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, help_text='Storage paths of resized images by name and format', verbose_name='Image variants'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0006_collect_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReasonHourlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.CharField(choices=[('BIRTHDAY', 'birthday'), ('WEDDING', 'wedding'), ('CHARITY', 'charity')], max_length=128, verbose_name='Reason')),
+                ('hour', models.DateTimeField(verbose_name='Hour')),
+                ('amount', models.PositiveBigIntegerField(default=0, verbose_name='Amount of money')),
+                ('donations_count', models.PositiveIntegerField(default=0, verbose_name='Donations count')),
+            ],
+            options={
+                'verbose_name': 'Reason hourly statistics',
+                'verbose_name_plural': 'Reason hourly statistics',
+                'constraints': [models.UniqueConstraint(fields=('reason', 'hour'), name='unique_reason_hourly_stats')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CollectHourlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Hour')),
+                ('amount', models.PositiveBigIntegerField(default=0, verbose_name='Amount of money')),
+                ('donations_count', models.PositiveIntegerField(default=0, verbose_name='Donations count')),
+                ('collect', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_stats', to='payment.collect')),
+            ],
+            options={
+                'verbose_name': 'Collect hourly statistics',
+                'verbose_name_plural': 'Collect hourly statistics',
+                'constraints': [models.UniqueConstraint(fields=('collect', 'hour'), name='unique_collect_hourly_stats')],
+            },
+        ),
+    ]
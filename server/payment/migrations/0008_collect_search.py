@@ -0,0 +1,80 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:20
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+SEARCH_INDEXES = (
+    django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='collect_search_vector_idx'),
+    django.contrib.postgres.indexes.GinIndex(fields=['title'], name='collect_title_trgm_idx', opclasses=('gin_trgm_ops',)),
+)
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce({row}title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce({row}description, '')), 'B')"
+)
+
+CREATE_TRIGGER = f"""
+CREATE FUNCTION payment_collect_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {SEARCH_VECTOR.format(row='NEW.')};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+CREATE TRIGGER payment_collect_search_vector_trigger
+BEFORE INSERT OR UPDATE OF title, description ON payment_collect
+FOR EACH ROW EXECUTE FUNCTION payment_collect_search_vector_update();
+UPDATE payment_collect SET search_vector = {SEARCH_VECTOR.format(row='')};
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER payment_collect_search_vector_trigger ON payment_collect;
+DROP FUNCTION payment_collect_search_vector_update();
+"""
+
+
+def create_search_indexes(apps, schema_editor):
+    """GIN indexes and trigger exist only on PostgreSQL."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    collect = apps.get_model('payment', 'Collect')
+    for index in SEARCH_INDEXES:
+        schema_editor.add_index(collect, index)
+    schema_editor.execute(CREATE_TRIGGER)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    collect = apps.get_model('payment', 'Collect')
+    schema_editor.execute(DROP_TRIGGER)
+    for index in SEARCH_INDEXES:
+        schema_editor.remove_index(collect, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0007_hourly_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='collect',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text='Title and description, kept up to date by trigger', null=True, verbose_name='Search vector'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='collect', index=index)
+                for index in SEARCH_INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(create_search_indexes, drop_search_indexes),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:01
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0008_collect_search'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='collect',
+            name='collect_ordering_idx',
+        ),
+    ]
@@ -1,13 +1,30 @@
-from typing import override
+import random
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import datetime
+from typing import NamedTuple, override
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVectorField,
+    TrigramWordSimilarity,
+)
+from django.db import connections, models, transaction
+from django.db.models import F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 from server.payment.choices import ReasonChoices
 
 User = get_user_model()
 
+RECENT_PAYMENTS_ORDERING = ('-created_at', '-id')
+SEARCH_CONFIG = 'simple'
+
 
 class DateTimeBaseModel(models.Model):
     """Base model for creating created_at and updated_at fields."""
@@ -39,6 +56,17 @@ class Payment(DateTimeBaseModel):
         verbose_name_plural = 'Payments'
         ordering = ('amount', 'comment')
         default_related_name = '%(class)ss'
+        indexes = (
+            models.Index(
+                fields=('collect', '-created_at', '-id'),
+                name='payment_collect_recent_idx',
+                include=('amount',),
+            ),
+            models.Index(
+                fields=('-created_at', '-id'),
+                name='payment_created_cursor_idx',
+            ),
+        )
 
     @override
     def __str__(self):
@@ -46,6 +74,178 @@ class Payment(DateTimeBaseModel):
         return f'{self.collect.title}: {self.amount}'
 
 
+class DonationResult(NamedTuple):
+    """Collect totals returned by the atomic donation update."""
+
+    current_amount: int
+    donators_count: int
+    is_finished: bool
+    finished_at: datetime | None
+    target_amount: int | None
+    reason: str
+
+
+class CollectQuerySet(models.QuerySet):
+    """QuerySet with atomic donation logic for collects."""
+
+    def with_live_totals(self):
+        """Annotate collects with sums of their counter shards."""
+        shards = CollectCounterShard.objects.filter(
+            collect=OuterRef('pk')
+        ).values('collect').order_by()
+        return self.annotate(
+            shard_amount=Coalesce(
+                Subquery(shards.annotate(total=Sum('amount')).values('total')),
+                0,
+            ),
+            shard_donators_count=Coalesce(
+                Subquery(
+                    shards.annotate(
+                        total=Sum('donators_count')
+                    ).values('total')
+                ),
+                0,
+            ),
+        )
+
+    def search(self, text: str):
+        """Full-text search in title and description ordered by rank.
+
+        Uses search_vector column with GIN index on PostgreSQL, other
+        databases fall back to case-insensitive substring match.
+        """
+        if connections[self.db].vendor != 'postgresql':
+            return self.filter(
+                Q(title__icontains=text) | Q(description__icontains=text)
+            )
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+        return self.filter(search_vector=query).annotate(
+            rank=SearchRank('search_vector', query)
+        ).order_by('-rank', 'pk')
+
+    def typeahead(self, text: str):
+        """Collects with title words similar to text, best first.
+
+        Trigram GIN index on title serves the similarity operator on
+        PostgreSQL, other databases fall back to substring match.
+        """
+        if connections[self.db].vendor != 'postgresql':
+            return self.filter(title__icontains=text)
+        return self.filter(title__trigram_word_similar=text).annotate(
+            similarity=TrigramWordSimilarity(text, 'title')
+        ).order_by('-similarity', 'pk')
+
+    def donate(self, pk: int, amount: int) -> DonationResult | None:
+        """Apply donation to collect in one conditional UPDATE.
+
+        Collects with sharded counters and without target amount are
+        skipped by the UPDATE and get the donation on a random shard.
+        Hourly statistics are left to the caller.
+        Returns new totals or None when collect is finished, missing
+        or donation exceeds the target amount.
+        """
+        now = timezone.now()
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        finishes = (
+            'target_amount IS NOT NULL '
+            'AND current_amount + %s >= target_amount'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET '
+                'current_amount = current_amount + %s, '
+                'donators_count = donators_count + 1, '
+                f'is_finished = ({finishes}), '
+                f'finished_at = CASE WHEN {finishes} THEN %s '
+                'ELSE finished_at END, '
+                'updated_at = %s '
+                'WHERE id = %s AND NOT is_finished AND ('
+                'target_amount IS NULL '
+                'OR current_amount + %s <= target_amount) '
+                'AND NOT (is_sharded AND target_amount IS NULL) '
+                'RETURNING current_amount, donators_count, is_finished, '
+                'target_amount, reason',
+                [
+                    amount,
+                    amount,
+                    amount,
+                    connection.ops.adapt_datetimefield_value(now),
+                    connection.ops.adapt_datetimefield_value(now),
+                    pk,
+                    amount,
+                ],
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return self.donate_to_shard(pk, amount)
+        current_amount, donators_count, is_finished, target, reason = row
+        return DonationResult(
+            current_amount=current_amount,
+            donators_count=donators_count,
+            is_finished=bool(is_finished),
+            finished_at=now if is_finished else None,
+            target_amount=target,
+            reason=reason,
+        )
+
+    def donate_to_shard(self, pk: int, amount: int) -> DonationResult | None:
+        """Increment random counter shard of sharded collect."""
+        if not self.filter(
+            pk=pk,
+            is_sharded=True,
+            is_finished=False,
+            target_amount__isnull=True,
+        ).exists():
+            return None
+        index = random.randrange(settings.COLLECT_COUNTER_SHARDS)
+        shard = CollectCounterShard.objects.filter(collect_id=pk, index=index)
+        increment = {
+            'amount': F('amount') + amount,
+            'donators_count': F('donators_count') + 1,
+        }
+        if not shard.update(**increment):
+            CollectCounterShard.objects.bulk_create(
+                [
+                    CollectCounterShard(collect_id=pk, index=i)
+                    for i in range(settings.COLLECT_COUNTER_SHARDS)
+                ],
+                ignore_conflicts=True,
+            )
+            shard.update(**increment)
+        collect = self.with_live_totals().get(pk=pk)
+        return DonationResult(
+            current_amount=collect.live_current_amount,
+            donators_count=collect.live_donators_count,
+            is_finished=False,
+            finished_at=None,
+            target_amount=None,
+            reason=collect.reason,
+        )
+
+    def rollup_counter_shards(self, pk: int) -> None:
+        """Fold counter shards of collect into its totals."""
+        with transaction.atomic():
+            shards = list(
+                CollectCounterShard.objects.select_for_update().filter(
+                    collect_id=pk
+                ).exclude(amount=0, donators_count=0)
+            )
+            if not shards:
+                return
+            CollectCounterShard.objects.filter(
+                pk__in=[shard.pk for shard in shards]
+            ).update(amount=0, donators_count=0)
+            self.filter(pk=pk).update(
+                current_amount=F('current_amount') + sum(
+                    shard.amount for shard in shards
+                ),
+                donators_count=F('donators_count') + sum(
+                    shard.donators_count for shard in shards
+                ),
+            )
+
+
 class Collect(DateTimeBaseModel):
     user = models.ForeignKey(
         to=User,
@@ -85,11 +285,54 @@ class Collect(DateTimeBaseModel):
         blank=True,
         null=True,
     )
+    image_variants = models.JSONField(
+        'Image variants',
+        default=dict,
+        blank=True,
+        help_text='Storage paths of resized images by name and format',
+    )
+    is_sharded = models.BooleanField(
+        'Sharded counters',
+        default=False,
+        help_text='Spread payments of collect without target over shards',
+    )
+    search_vector = SearchVectorField(
+        'Search vector',
+        null=True,
+        editable=False,
+        help_text='Title and description, kept up to date by trigger',
+    )
 
     class Meta:
         verbose_name = 'Collect'
         verbose_name_plural = 'Collects'
         ordering = ('title', 'target_amount', 'current_amount')
+        indexes = (
+            models.Index(
+                fields=('-created_at', '-id'),
+                name='collect_created_cursor_idx',
+            ),
+            models.Index(
+                fields=('-created_at', '-id'),
+                name='collect_active_created_idx',
+                condition=models.Q(is_finished=False),
+            ),
+            models.Index(
+                fields=('reason', '-created_at'),
+                name='collect_reason_created_idx',
+            ),
+            GinIndex(
+                fields=('search_vector',),
+                name='collect_search_vector_idx',
+            ),
+            GinIndex(
+                fields=('title',),
+                name='collect_title_trgm_idx',
+                opclasses=('gin_trgm_ops',),
+            ),
+        )
+
+    objects = CollectQuerySet.as_manager()
 
     @override
     def __str__(self):
@@ -97,17 +340,218 @@ class Collect(DateTimeBaseModel):
         return f'{self.title}: {self.current_amount}/{self.target_amount}'
 
     def add_payment(self, user, amount, comment):
-        """Method for adding payments."""
-        payment = Payment.objects.create(
-            user=user,
-            collect=self,
-            amount=amount,
-            comment=comment,
-        )
-        self.current_amount += amount
-        self.donators_count += 1
-        if self.target_amount and self.current_amount >= self.target_amount:
-            self.is_finished = True
-            self.finished_at = timezone.now()
-        self.save()
+        """Method for adding payments.
+
+        Returns None when collect can not accept the donation. Hourly
+        statistics are upserted in the same transaction.
+        """
+        with transaction.atomic():
+            result = Collect.objects.donate(self.pk, amount)
+            if result is None:
+                return None
+            write_donation_stats(*donation_buckets(
+                ((self.pk, result.reason, amount),), timezone.now()
+            ))
+            payment = Payment.objects.create(
+                user=user,
+                collect=self,
+                amount=amount,
+                comment=comment,
+            )
+        self.apply_donation_result(result)
         return payment
+
+    @property
+    def recent_payments(self) -> list[Payment]:
+        """Latest payments of collect, prefetched or loaded by window."""
+        if hasattr(self, 'prefetched_recent_payments'):
+            return self.prefetched_recent_payments
+        return list(
+            self.payments.order_by(*RECENT_PAYMENTS_ORDERING)[
+                :settings.COLLECT_RECENT_PAYMENTS
+            ]
+        )
+
+    @property
+    def live_current_amount(self) -> int:
+        """Current amount including counter shards not rolled up yet."""
+        return self.current_amount + self._shard_totals()[0]
+
+    @property
+    def live_donators_count(self) -> int:
+        """Donators count including counter shards not rolled up yet."""
+        return self.donators_count + self._shard_totals()[1]
+
+    def _shard_totals(self) -> tuple[int, int]:
+        """Sums of counter shards, annotated or loaded once."""
+        if not self.is_sharded:
+            return 0, 0
+        if hasattr(self, 'shard_amount'):
+            return self.shard_amount, self.shard_donators_count
+        if 'counter_shards' in getattr(self, '_prefetched_objects_cache', {}):
+            shards = self.counter_shards.all()
+            self.shard_amount = sum(shard.amount for shard in shards)
+            self.shard_donators_count = sum(
+                shard.donators_count for shard in shards
+            )
+        else:
+            totals = self.counter_shards.aggregate(
+                amount=Sum('amount', default=0),
+                donators_count=Sum('donators_count', default=0),
+            )
+            self.shard_amount = totals['amount']
+            self.shard_donators_count = totals['donators_count']
+        return self.shard_amount, self.shard_donators_count
+
+    def apply_donation_result(self, result: DonationResult) -> None:
+        """Sync in-memory totals with result of atomic donation."""
+        if self.is_sharded and self.target_amount is None:
+            self.__dict__.pop('shard_amount', None)
+            self.__dict__.pop('shard_donators_count', None)
+            return
+        self.current_amount = result.current_amount
+        self.donators_count = result.donators_count
+        self.is_finished = result.is_finished
+        self.finished_at = result.finished_at
+
+
+class CollectCounterShard(models.Model):
+    """Counter shard with part of collect totals before rollup."""
+
+    collect = models.ForeignKey(
+        to=Collect,
+        on_delete=models.CASCADE,
+        related_name='counter_shards',
+    )
+    index = models.PositiveSmallIntegerField('Shard index')
+    amount = models.PositiveBigIntegerField('Amount of money', default=0)
+    donators_count = models.PositiveIntegerField('Donators count', default=0)
+
+    class Meta:
+        verbose_name = 'Collect counter shard'
+        verbose_name_plural = 'Collect counter shards'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('collect', 'index'),
+                name='unique_collect_counter_shard',
+            ),
+        )
+
+    @override
+    def __str__(self):
+        """Method for display short info of counter shard."""
+        return f'{self.collect_id}#{self.index}: {self.amount}'
+
+
+class HourlyStatsQuerySet(models.QuerySet):
+    """QuerySet with incremental upsert of hourly buckets."""
+
+    def record(self, buckets: dict[tuple, tuple[int, int]]) -> None:
+        """Add amount and donations count to buckets in one statement.
+
+        Keys of buckets are (bucket field value, hour) pairs, rows are
+        sorted so concurrent writers lock them in the same order.
+        """
+        if not buckets:
+            return
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        column = quote(
+            self.model._meta.get_field(self.model.bucket_field).column
+        )
+        params = []
+        for (key, hour), (amount, count) in sorted(buckets.items()):
+            params.extend((
+                key,
+                connection.ops.adapt_datetimefield_value(hour),
+                amount,
+                count,
+            ))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({column}, hour, amount, '
+                'donations_count) VALUES '
+                + ', '.join(['(%s, %s, %s, %s)'] * len(buckets))
+                + f' ON CONFLICT ({column}, hour) DO UPDATE SET '
+                f'amount = {table}.amount + excluded.amount, '
+                f'donations_count = {table}.donations_count '
+                '+ excluded.donations_count',
+                params,
+            )
+
+
+class CollectHourlyStats(models.Model):
+    """Donations to collect within one hour."""
+
+    collect = models.ForeignKey(
+        to=Collect,
+        on_delete=models.CASCADE,
+        related_name='hourly_stats',
+    )
+    hour = models.DateTimeField('Hour')
+    amount = models.PositiveBigIntegerField('Amount of money', default=0)
+    donations_count = models.PositiveIntegerField(
+        'Donations count', default=0
+    )
+
+    objects = HourlyStatsQuerySet.as_manager()
+    bucket_field = 'collect'
+
+    class Meta:
+        verbose_name = 'Collect hourly statistics'
+        verbose_name_plural = 'Collect hourly statistics'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('collect', 'hour'),
+                name='unique_collect_hourly_stats',
+            ),
+        )
+
+
+class ReasonHourlyStats(models.Model):
+    """Donations to collects with one reason within one hour."""
+
+    reason = models.CharField(
+        'Reason',
+        max_length=128,
+        choices=ReasonChoices.choices,
+    )
+    hour = models.DateTimeField('Hour')
+    amount = models.PositiveBigIntegerField('Amount of money', default=0)
+    donations_count = models.PositiveIntegerField(
+        'Donations count', default=0
+    )
+
+    objects = HourlyStatsQuerySet.as_manager()
+    bucket_field = 'reason'
+
+    class Meta:
+        verbose_name = 'Reason hourly statistics'
+        verbose_name_plural = 'Reason hourly statistics'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('reason', 'hour'),
+                name='unique_reason_hourly_stats',
+            ),
+        )
+
+
+def donation_buckets(
+    donations: Iterable[tuple[int, str, int]], at: datetime
+) -> tuple[dict, dict]:
+    """Collect and reason hourly buckets of (collect_id, reason, amount)."""
+    hour = at.replace(minute=0, second=0, microsecond=0)
+    by_collect = defaultdict(lambda: [0, 0])
+    by_reason = defaultdict(lambda: [0, 0])
+    for collect_id, reason, amount in donations:
+        for bucket in (by_collect[collect_id, hour], by_reason[reason, hour]):
+            bucket[0] += amount
+            bucket[1] += 1
+    return by_collect, by_reason
+
+
+def write_donation_stats(by_collect: dict, by_reason: dict) -> None:
+    """Upsert collect and reason buckets into hourly tables."""
+    CollectHourlyStats.objects.record(by_collect)
+    ReasonHourlyStats.objects.record(by_reason)
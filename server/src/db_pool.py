@@ -0,0 +1,38 @@
+from django.db import connections
+
+_inherited_pools = []
+
+
+def _pooled_connections():
+    """Connection wrappers of this process which own a pool."""
+    for connection in connections.all(initialized_only=True):
+        pools = getattr(type(connection), '_connection_pools', {})
+        if connection.alias in pools:
+            yield connection, pools
+
+
+def close_connection_pools() -> None:
+    """Close connections and pools before the process forks workers."""
+    connections.close_all()
+    for connection, _ in list(_pooled_connections()):
+        connection.close_pool()
+
+
+def forget_connection_pools() -> None:
+    """Drop pools inherited by forked worker without closing them.
+
+    Sockets of inherited connections are shared with the parent, so
+    closing them would terminate its sessions. Dropped pools stay
+    referenced to keep their finalizers away from these sockets, and
+    the worker opens its own pool on first query.
+    """
+    for connection, pools in list(_pooled_connections()):
+        _inherited_pools.append(pools.pop(connection.alias))
+
+
+def connection_pool_stats() -> dict[str, dict[str, int]]:
+    """Counters of every open connection pool in this process."""
+    return {
+        connection.alias: pools[connection.alias].get_stats()
+        for connection, pools in _pooled_connections()
+    }
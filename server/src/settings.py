@@ -23,6 +23,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'server.api.apps.ApiConfig',
     'rest_framework',
     'rest_framework_simplejwt',
@@ -33,6 +34,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'server.api.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,6 +73,22 @@ DATABASES = {
         'PORT': os.getenv('POSTGRES_PORT', 5432),
     }
 }
+if bool(int(os.getenv('DB_POOL_ENABLED', 1))):
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'name': 'default',
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+            'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(
+        os.getenv('DB_CONN_MAX_AGE', 60)
+    )
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -87,6 +105,33 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'argon2')
+PASSWORD_HASHER_CLASSES = {
+    'argon2': 'server.api.hashers.TunedArgon2PasswordHasher',
+    'scrypt': 'server.api.hashers.TunedScryptPasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [
+    PASSWORD_HASHER_CLASSES[PASSWORD_HASHER],
+    *(
+        path for name, path in PASSWORD_HASHER_CLASSES.items()
+        if name != PASSWORD_HASHER
+    ),
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+PASSWORD_HASHER_COST = {
+    'argon2': {
+        'time_cost': int(os.getenv('PASSWORD_ARGON2_TIME_COST', 2)),
+        'memory_cost': int(os.getenv('PASSWORD_ARGON2_MEMORY_KIB', 19456)),
+        'parallelism': int(os.getenv('PASSWORD_ARGON2_PARALLELISM', 1)),
+    },
+    'scrypt': {
+        'work_factor': 2 ** int(os.getenv('PASSWORD_SCRYPT_LOG2_N', 15)),
+        'block_size': int(os.getenv('PASSWORD_SCRYPT_BLOCK_SIZE', 8)),
+        'parallelism': int(os.getenv('PASSWORD_SCRYPT_PARALLELISM', 3)),
+    },
+}
+
 LANGUAGE_CODE = 'ru'
 
 TIME_ZONE = 'UTC'
@@ -101,17 +146,42 @@ STATIC_ROOT = 'static'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = 'media'
 
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    'exports': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {
+            'location': os.getenv('PAYMENT_EXPORT_ROOT', 'private/exports'),
+            'base_url': None,
+        },
+    },
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+JWT_STATELESS_AUTH = bool(int(os.getenv('JWT_STATELESS_AUTH', 1)))
+JWT_USER_STATUS_TIMEOUT = int(os.getenv('JWT_USER_STATUS_TIMEOUT', 300))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'server.api.authentication.StatelessJWTAuthentication'
+        if JWT_STATELESS_AUTH
+        else 'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_RENDERER_CLASSES': [
+        'server.api.instrumentation.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'server.api.pagination.ApproximateCountPagination',
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'PAGE_SIZE': 10,
 }
@@ -119,8 +189,40 @@ REST_FRAMEWORK = {
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=2),
+    'TOKEN_OBTAIN_SERIALIZER': (
+        'server.api.authentication.ClaimsTokenObtainPairSerializer'
+    ),
+    'TOKEN_REFRESH_SERIALIZER': (
+        'server.api.authentication.ClaimsTokenRefreshSerializer'
+    ),
+    'TOKEN_USER_CLASS': 'server.api.authentication.ClaimsTokenUser',
 }
 
+INSTRUMENTATION = {
+    'SERVER_TIMING': bool(int(os.getenv('SERVER_TIMING_ENABLED', 0))),
+    'SLOW_REQUEST_MS': float(os.getenv('SLOW_REQUEST_MS', 500)),
+    'SLOW_SAMPLE_RATE': float(os.getenv('SLOW_REQUEST_SAMPLE_RATE', 0.1)),
+}
+
+METRICS_ALLOWED_NETWORKS = os.getenv(
+    'METRICS_ALLOWED_NETWORKS', '127.0.0.1/32,::1/128'
+).split(',')
+
+CACHE_STALE_WHILE_REVALIDATE = bool(
+    int(os.getenv('CACHE_STALE_WHILE_REVALIDATE', 0))
+)
+
+CACHE_RENDERED_RESPONSES = bool(
+    int(os.getenv('CACHE_RENDERED_RESPONSES', 0))
+)
+CACHE_RENDERED_COMPRESSION = os.getenv('CACHE_RENDERED_COMPRESSION') or None
+CACHE_LOCAL_TIER = {
+    'ENABLED': bool(int(os.getenv('CACHE_LOCAL_TIER_ENABLED', 0))),
+    'MAX_ENTRIES': int(os.getenv('CACHE_LOCAL_TIER_MAX_ENTRIES', 512)),
+    'TIMEOUT': float(os.getenv('CACHE_LOCAL_TIER_TIMEOUT', 5)),
+}
+CACHE_INVALIDATION_CHANNEL = 'cache-invalidation'
+
 CACHES = {
     'default': {
         'BACKEND': 'django_redis.cache.RedisCache',
@@ -133,12 +235,63 @@ CACHES = {
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'example@mail.com'
+EMAIL_BUFFER_BATCH_SIZE = int(os.getenv('EMAIL_BUFFER_BATCH_SIZE', 500))
 
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+CELERY_BEAT_SCHEDULE = {
+    'rollup-counter-shards': {
+        'task': 'server.api.tasks.rollup_counter_shards_task',
+        'schedule': int(os.getenv('COUNTER_SHARDS_ROLLUP_INTERVAL', 60)),
+    },
+    'fold-donation-stats': {
+        'task': 'server.api.tasks.fold_donation_stats_task',
+        'schedule': int(os.getenv('DONATION_STATS_FOLD_INTERVAL', 60)),
+    },
+    'flush-email-buffer': {
+        'task': 'server.api.tasks.flush_email_buffer_task',
+        'schedule': int(os.getenv('EMAIL_BUFFER_FLUSH_INTERVAL', 10)),
+    },
+    'delete-expired-exports': {
+        'task': 'server.api.tasks.delete_expired_exports_task',
+        'schedule': int(os.getenv('PAYMENT_EXPORT_CLEANUP_INTERVAL', 3600)),
+    },
+}
+
+COLLECT_COUNTER_SHARDS = int(os.getenv('COLLECT_COUNTER_SHARDS', 8))
+COLLECT_RECENT_PAYMENTS = int(os.getenv('COLLECT_RECENT_PAYMENTS', 10))
+PAYMENT_BULK_MAX_ROWS = int(os.getenv('PAYMENT_BULK_MAX_ROWS', 10000))
+PAYMENT_EXPORT_CHUNK_SIZE = int(os.getenv('PAYMENT_EXPORT_CHUNK_SIZE', 2000))
+PAYMENT_EXPORT_SPOOL_SIZE = int(
+    os.getenv('PAYMENT_EXPORT_SPOOL_SIZE', 16 * 1024 * 1024)
+)
+PAYMENT_EXPORT_TTL = int(os.getenv('PAYMENT_EXPORT_TTL', 24 * 60 * 60))
+PAYMENT_EXPORT_ACCEL_REDIRECT = os.getenv('PAYMENT_EXPORT_ACCEL_REDIRECT', '')
+PAYMENT_THROTTLE_RATES = {
+    'user': os.getenv('PAYMENT_USER_RATE', '30/min'),
+    'collect': os.getenv('PAYMENT_COLLECT_RATE', '300/min'),
+    'bulk_rows': os.getenv(
+        'PAYMENT_BULK_ROW_RATE', f'{PAYMENT_BULK_MAX_ROWS}/hour'
+    ),
+}
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+IDEMPOTENCY_PENDING_TTL = int(os.getenv('IDEMPOTENCY_PENDING_TTL', 60))
+COLLECT_IMAGE_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF')
+COLLECT_IMAGE_MAX_SIDE = int(os.getenv('COLLECT_IMAGE_MAX_SIDE', 8000))
+COLLECT_IMAGE_MAX_PIXELS = int(
+    os.getenv('COLLECT_IMAGE_MAX_PIXELS', 40_000_000)
+)
+COLLECT_IMAGE_VARIANTS = {'thumbnail': 320, 'medium': 1024}
+COLLECT_IMAGE_QUALITY = int(os.getenv('COLLECT_IMAGE_QUALITY', 80))
+
+API_ASYNC_READS = bool(int(os.getenv('API_ASYNC_READS', 0)))
+API_PAGINATION_MODE = os.getenv('API_PAGINATION_MODE', 'page')
+API_APPROXIMATE_COUNT_THRESHOLD = int(
+    os.getenv('API_APPROXIMATE_COUNT_THRESHOLD', 0)
+)
 
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Collect API',
@@ -158,6 +311,14 @@ SPECTACULAR_SETTINGS = {
             'name': 'Payments',
             'description': 'Creation and management of payments',
         },
+        {
+            'name': 'Service',
+            'description': 'Service statistics for administrators',
+        },
+        {
+            'name': 'Statistics',
+            'description': 'Leaderboards and hourly donation statistics',
+        },
     ],
 }
 
@@ -0,0 +1,53 @@
+"""Settings for offline benchmarks, no Redis or Celery broker needed.
+
+SQLite file is used by default, BENCH_DATABASE=postgresql keeps
+PostgreSQL from POSTGRES_* variables. Cache is in process memory and
+Celery tasks run eagerly, so every request does its full work inline.
+
+    python manage.py migrate --settings=server.src.settings_bench
+    python manage.py loadtest --settings=server.src.settings_bench --scale 1
+"""
+import os
+
+from server.src.settings import *  # noqa: F401,F403
+from server.src.settings import ALLOWED_HOSTS, BASE_DIR, INSTRUMENTATION
+
+DEBUG = False
+
+ALLOWED_HOSTS = [*ALLOWED_HOSTS, 'localhost', '127.0.0.1', 'testserver']
+
+if os.getenv('BENCH_DATABASE', 'sqlite') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv(
+                'BENCH_SQLITE_PATH', BASE_DIR.parent / 'bench.sqlite3'
+            ),
+            'OPTIONS': {
+                'timeout': 30,
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+
+# SQLite ignores include= of covering indexes, PostgreSQL uses them.
+SILENCED_SYSTEM_CHECKS = ['models.W040']
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bench',
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
+    }
+}
+
+CELERY_TASK_ALWAYS_EAGER = True
+CELERY_TASK_EAGER_PROPAGATES = True
+
+EMAIL_BACKEND = 'django.core.mail.backends.dummy.EmailBackend'
+
+INSTRUMENTATION = {
+    **INSTRUMENTATION,
+    'SERVER_TIMING': True,
+    'SLOW_SAMPLE_RATE': 0.0,
+}
@@ -8,7 +8,8 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
-from server.api.urls import router as api_router
+from server.api.instrumentation import metrics_view
+from server.api.views import CacheStatsView, ConnectionPoolStatsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -28,7 +29,14 @@ urlpatterns = [
         TokenRefreshView.as_view(),
         name='token_refresh',
     ),
-    path('api/', include(api_router.urls)),
+    path('api/cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path(
+        'api/db-pool-stats/',
+        ConnectionPoolStatsView.as_view(),
+        name='db-pool-stats',
+    ),
+    path('api/', include('server.api.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG: